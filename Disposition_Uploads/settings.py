@@ -75,14 +75,40 @@ WSGI_APPLICATION = 'Disposition_Uploads.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite tuned for several gunicorn workers: WAL lets readers run alongside
+# the single writer, busy_timeout waits for the write lock instead of failing,
+# and connections are kept open between requests. Writes from the app go
+# through uploader.db.serialized_write.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA busy_timeout=20000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+        },
+        # File-backed test database so concurrency tests exercise real locking
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# serialized_write logs waits for the db-write lock at least this long (0 logs every write)
+DB_LOCK_WAIT_LOG_MS = float(os.environ.get('DB_LOCK_WAIT_LOG_MS', 100))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -123,7 +149,18 @@ STATIC_URL = '/static/'
 
 MEDIA_URL = '/media/'
 # MEDIA_ROOT = BASE_DIR / 'media'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# Layout of raw uploads and cleaned CSVs under MEDIA_ROOT (see uploader/paths.py):
+# 'date' partitions both by upload day and id, 'flat' keeps one folder per process.
+# Existing files are moved to the configured layout by `manage.py migrate_storage`.
+STORAGE_LAYOUT = os.environ.get('STORAGE_LAYOUT', 'date')
+
+# Downloads: '' streams from Django; 'x-accel' hands the transfer to nginx via
+# X-Accel-Redirect (DOWNLOAD_ACCEL_PREFIX must be an internal location aliased
+# to MEDIA_ROOT); 'x-sendfile' uses the X-Sendfile header (Apache/lighttpd).
+DOWNLOAD_ACCEL_MODE = os.environ.get('DOWNLOAD_ACCEL_MODE', '')
+DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -135,36 +172,111 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = 'login'
 
 
-LOG_DIR = os.path.join(MEDIA_ROOT, 'logs')
+# Cleaned files are published here for the portal
+PORTAL_DATA_ROOT = os.environ.get('PORTAL_DATA_ROOT', '/Disposition_Portal_Data')
+
+# Upper bound on the estimated in-memory size of a single upload while cleaning.
+# Worst case is one upload per request thread plus one per sheet parse process:
+# keep (GUNICORN_WORKERS x GUNICORN_THREADS + SHEET_PARSE_WORKERS) x budget below
+# the container memory limit.
+CLEAN_MEMORY_BUDGET_MB = int(os.environ.get('CLEAN_MEMORY_BUDGET_MB', 512))
+
+# Retention for raw uploads and cleaned CSVs, applied by `manage.py apply_retention`.
+# Files older than compress_after_days move into media/archive/<process>/<YYYY-MM>.zip;
+# whole months older than purge_after_days are deleted. Entries keyed by process name
+# override 'default'; None disables that tier.
+RETENTION_POLICIES = {
+    'default': {
+        'compress_after_days': int(os.environ.get('RETENTION_COMPRESS_DAYS', 90)),
+        'purge_after_days': int(os.environ['RETENTION_PURGE_DAYS']) if os.environ.get('RETENTION_PURGE_DAYS') else None,
+    },
+}
+
+
+# Multi-sheet workbooks: a regex per process picks sheets by name; otherwise every
+# sheet whose header matches the reference format is cleaned. Sheets are parsed in
+# at most SHEET_PARSE_WORKERS processes across the whole server (all gunicorn
+# workers and threads); an upload that finds none free parses in its own thread.
+SHEET_NAME_PATTERNS = {}
+SHEET_PARSE_WORKERS = int(os.environ.get('SHEET_PARSE_WORKERS', 4))
+
+# Uploads are checked against the reference header while they arrive
+# (uploader/upload_handlers.py): a file for the wrong process is rejected after
+# at most UPLOAD_SNIFF_BYTES instead of after the whole body has been received.
+FILE_UPLOAD_HANDLERS = [
+    'uploader.upload_handlers.HeaderCheckUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_SNIFF_BYTES = int(os.environ.get('UPLOAD_SNIFF_BYTES', 1024 * 1024))
+
+# Incremental merge (uploader/merge.py): processes listed here publish only new or
+# changed rows per upload, plus one consolidated file per date in APR_Consolidated.
+# The value lists the row key columns; None keys on the agent column and Raw Date.
+# e.g. {'JIO': None, 'HDFC': ['Agent Name', 'Raw Date']}
+MERGE_KEYS = {}
+
+LOG_DIR = os.environ.get('LOG_DIR') or os.path.join(MEDIA_ROOT, 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Logs are JSON lines written off the request thread (see uploader/log.py).
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 20 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+# Max records per level per minute and worker; levels not listed are unlimited.
+LOG_RATE_LIMITS = {
+    'DEBUG': int(os.environ.get('LOG_DEBUG_PER_MINUTE', 200)),
+    'INFO': int(os.environ.get('LOG_INFO_PER_MINUTE', 2000)),
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
 
     'formatters': {
-        'default': {
-            'format': '%(asctime)s - %(levelname)s - %(message)s',
+        'json': {
+            '()': 'uploader.log.JsonFormatter',
+        },
+    },
+
+    'filters': {
+        'context': {
+            '()': 'uploader.log.ContextFilter',
+        },
+        'rate_limit': {
+            '()': 'uploader.log.LevelRateLimitFilter',
+            'limits': LOG_RATE_LIMITS,
+            'period': 60,
         },
     },
 
     'handlers': {
         'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            '()': 'uploader.log.QueuedRotatingFileHandler',
+            'level': LOG_LEVEL,
             'filename': os.path.join(LOG_DIR, 'cleaning_errors.log'),
-            'formatter': 'default',
+            'max_bytes': LOG_MAX_BYTES,
+            'backup_count': LOG_BACKUP_COUNT,
+            'formatter': 'json',
+            'filters': ['context', 'rate_limit'],
         },
     },
 
     'root': {
         'handlers': ['file'],
-        'level': 'DEBUG',
+        'level': LOG_LEVEL,
     },
 }
 
 DEFAULT_FROM_EMAIL = 'ishita.jain@iccs.in'
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+FAILURE_EMAIL_RECIPIENTS = ['ishita.jain@iccs.in']
+# Cleaning failures are queued in the FailureNotification outbox and mailed by
+# `manage.py send_failure_notifications`. Set EMAIL_BACKEND to
+# django.core.mail.backends.console.EmailBackend or .filebased.EmailBackend
+# to keep mail local (e.g. for tests and load runs).
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.path.join(LOG_DIR, 'emails')
+EMAIL_TIMEOUT = 30
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
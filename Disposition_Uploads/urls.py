@@ -17,8 +17,6 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.urls import include
-from django.conf import settings
-from django.conf.urls.static import static
 
 
 urlpatterns = [
@@ -26,4 +24,5 @@ urlpatterns = [
     path('', include('uploader.urls')),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Media files are not served publicly; downloads go through the
+# authenticated views in uploader.views (see uploader/downloads.py).
@@ -0,0 +1,19 @@
+# Gunicorn settings (read automatically from the working directory).
+import os
+
+bind = "0.0.0.0:8540"
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# Preload: import the app, pandas/numpy and the process registries once in the
+# master and fork workers from it, so boots and worker recycles are fast.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        from uploader.startup import preload
+        preload()
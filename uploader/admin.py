@@ -1,12 +1,148 @@
+import datetime
+import hashlib
+from django.conf import settings
 from django.contrib import admin
-from .models import UploadedFile, UploadStatus
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import UploadedFile, UploadStatus, AgentDailyMinutes, ArchivedFile
+from .registry import get_process_options
+
+
+class CachedCountPaginator(Paginator):
+    """Remembers the changelist COUNT(*) for each distinct query for a few minutes."""
+    count_timeout = 300
+
+    @cached_property
+    def count(self):
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'admin-count:' + hashlib.md5(f"{sql}{params!r}".encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, self.count_timeout)
+        return count
+
+
+def next_period(d, kind):
+    if kind == 'year':
+        return datetime.date(d.year + 1, 1, 1)
+    if kind == 'month':
+        return datetime.date(d.year + d.month // 12, d.month % 12 + 1, 1)
+    return d + datetime.timedelta(days=1)
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """
+    dates()/datetimes() for the date hierarchy, found by seeking the index once
+    per year/month/day instead of a DISTINCT over a per-row truncation function.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        return self.periods(field_name, kind, order)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        return self.periods(field_name, kind, order, tzinfo or timezone.get_current_timezone() if settings.USE_TZ else None)
+
+    def periods(self, field_name, kind, order, tzinfo=None):
+        """Start of each period containing rows; datetimes are local midnights in `tzinfo`."""
+        values = self.order_by(field_name).values_list(field_name, flat=True)
+        periods, lower = [], None
+        while True:
+            first = (values if lower is None else values.filter(**{f'{field_name}__gte': lower})).first()
+            if first is None:
+                break
+            if isinstance(first, datetime.datetime):
+                first = (timezone.localtime(first, tzinfo) if timezone.is_aware(first) else first).date()
+            start = first.replace(month=1, day=1) if kind == 'year' else first.replace(day=1) if kind == 'month' else first
+            lower = next_period(start, kind)
+            if tzinfo is not None:
+                start = timezone.make_aware(datetime.datetime.combine(start, datetime.time()), tzinfo)
+                lower = timezone.make_aware(datetime.datetime.combine(lower, datetime.time()), tzinfo)
+            periods.append(start)
+        return periods[::-1] if order == 'DESC' else periods
+
+
+class ProcessListFilter(admin.SimpleListFilter):
+    """Process choices from media/process/process.csv instead of a DISTINCT over the table."""
+    title = 'process'
+    parameter_name = 'process'
+
+    def lookups(self, request, model_admin):
+        return [(p, p) for p in get_process_options()]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(process=self.value())
+        return queryset
+
+
+class ArchiveMonthListFilter(admin.SimpleListFilter):
+    """The last two years of archive months by calendar, instead of a DISTINCT over the table."""
+    title = 'month'
+    parameter_name = 'month'
+    months = 24
+
+    def lookups(self, request, model_admin):
+        today = timezone.localdate()
+        choices = []
+        for back in range(self.months):
+            year, month = divmod(today.year * 12 + today.month - 1 - back, 12)
+            label = f"{year}-{month + 1:02d}"
+            choices.append((label, label))
+        return choices
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(month=self.value())
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return IndexedDatesQuerySet(model=qs.model, query=qs.query, using=qs._db)
+
 
 @admin.register(UploadStatus)
-class UploadStatusAdmin(admin.ModelAdmin):
+class UploadStatusAdmin(LargeTableAdmin):
     list_display = ('process', 'date', 'status', 'uploaded_file', 'updated_at')
-    list_filter = ('status', 'process', 'date')
+    list_filter = ('status', ProcessListFilter)
     search_fields = ('process',)
+    list_select_related = ('uploaded_file',)
+    date_hierarchy = 'date'
+    raw_id_fields = ('uploaded_file',)
 
 @admin.register(UploadedFile)
-class UploadedFileAdmin(admin.ModelAdmin):
+class UploadedFileAdmin(LargeTableAdmin):
     list_display = ('process', 'uploaded_at', 'user', 'file')
+    list_filter = (ProcessListFilter,)
+    list_select_related = ('user',)
+    date_hierarchy = 'uploaded_at'
+    raw_id_fields = ('user',)
+
+@admin.register(AgentDailyMinutes)
+class AgentDailyMinutesAdmin(LargeTableAdmin):
+    list_display = ('process', 'date', 'agent', 'minutes', 'row_count', 'updated_at')
+    list_filter = (ProcessListFilter,)
+    date_hierarchy = 'date'
+    search_fields = ('agent',)
+    raw_id_fields = ('uploaded_file',)
+
+@admin.register(ArchivedFile)
+class ArchivedFileAdmin(LargeTableAdmin):
+    list_display = ('uploaded_file', 'kind', 'month', 'archive', 'size', 'archived_at', 'purged_at')
+    list_filter = ('kind', ArchiveMonthListFilter)
+    list_select_related = ('uploaded_file',)
+    raw_id_fields = ('uploaded_file',)
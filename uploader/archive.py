@@ -0,0 +1,115 @@
+"""
+Tiered retention for raw uploads and cleaned CSVs.
+
+Files past a process's compress window are moved into one zip per upload
+month, media/archive/<process>/<YYYY-MM>.zip, and indexed by ArchivedFile so
+they can still be downloaded by UploadedFile id. Months past the purge window
+are deleted; their ArchivedFile rows stay behind with purged_at set.
+"""
+import os
+import shutil
+import zipfile
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .fsutil import write_atomic
+from .locks import file_lock
+from .paths import cleaned_path_for, prune_empty_dirs
+from .preview import index_path
+
+# Already compressed; deflating them again only burns CPU
+STORED_EXTENSIONS = ('.xlsx', '.zip')
+
+
+def retention_policy(process_name):
+    policies = getattr(settings, 'RETENTION_POLICIES', {})
+    policy = {'compress_after_days': None, 'purge_after_days': None}
+    policy.update(policies.get('default', {}))
+    policy.update(policies.get(process_name, {}))
+    return policy
+
+
+def cutoffs(process_name, now=None):
+    """(compress_before, purge_before_month) for a process; either may be None."""
+    now = now or timezone.now()
+    policy = retention_policy(process_name)
+    compress_days, purge_days = policy['compress_after_days'], policy['purge_after_days']
+    purge_month = None
+    if purge_days is not None:
+        # Archives are monthly, so only months that ended before the cutoff go
+        purge_month = timezone.localtime(now - timedelta(days=purge_days)).strftime('%Y-%m')
+        # Anything that is due for purging has to be archived (or dropped) first
+        compress_days = purge_days if compress_days is None else min(compress_days, purge_days)
+    compress_before = now - timedelta(days=compress_days) if compress_days is not None else None
+    return compress_before, purge_month
+
+
+def upload_month(uploaded_file):
+    return timezone.localtime(uploaded_file.uploaded_at).strftime('%Y-%m')
+
+
+def archive_path(process_name, month):
+    return os.path.join(settings.MEDIA_ROOT, 'archive', process_name, f'{month}.zip')
+
+
+def source_path(uploaded_file, kind):
+    return uploaded_file.file.path if kind == 'raw' else cleaned_path_for(uploaded_file)
+
+
+def member_name(uploaded_file, kind, path):
+    return f"{kind}/{uploaded_file.id}/{os.path.basename(path)}"
+
+
+def archive_files(process_name, month, entries):
+    """
+    Add (path, member) entries to the month archive and return [(member, size)].
+    Members already in the zip (left by a run that stopped before indexing) are kept as is.
+
+    New members are appended to a byte copy of the archive, which is then renamed
+    over the old one: a run killed part-way leaves the previous archive intact, and
+    the members already archived are not recompressed.
+    """
+    path = archive_path(process_name, month)
+    written = []
+
+    def write(tmp_path):
+        if os.path.exists(path):
+            shutil.copyfile(path, tmp_path)
+        with zipfile.ZipFile(tmp_path, 'a', allowZip64=True) as zf:
+            present = {info.filename: info.file_size for info in zf.infolist()}
+            for source, member in entries:
+                if member not in present:
+                    compression = zipfile.ZIP_STORED if source.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+                    zf.write(source, member, compress_type=compression, compresslevel=6)
+                    present[member] = os.path.getsize(source)
+                written.append((member, present[member]))
+
+    with file_lock(f"archive/{process_name}/{month}"):
+        # The originals are deleted next; write_atomic has the archive on disk first
+        write_atomic(path, write)
+    return written
+
+
+def remove_source(path, kind):
+    for p in (path, index_path(path)) if kind == 'clean' else (path,):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+    # Date-partitioned folders would otherwise pile up empty
+    prune_empty_dirs(path, os.path.join(settings.MEDIA_ROOT, 'uploads' if kind == 'raw' else 'clean'))
+
+
+def purge_archive(process_name, month):
+    with file_lock(f"archive/{process_name}/{month}"):
+        try:
+            os.remove(archive_path(process_name, month))
+        except FileNotFoundError:
+            pass
+
+
+def open_archived(archived):
+    """Readable file object for an ArchivedFile member; closing it releases the zip."""
+    with zipfile.ZipFile(os.path.join(settings.MEDIA_ROOT, archived.archive)) as zf:
+        # The member keeps the underlying file open after the ZipFile is closed
+        return zf.open(archived.member)
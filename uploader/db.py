@@ -0,0 +1,49 @@
+"""
+Write path for the SQLite database.
+
+SQLite allows one writer at a time. Short write transactions go through
+`serialized_write`, which queues writers from every worker process and
+thread on one file lock, runs the work in a transaction and retries if
+SQLite still reports the database as locked. Waits for that lock longer than
+DB_LOCK_WAIT_LOG_MS are logged with their duration (`lock_wait_ms`), which is
+where write contention shows up.
+"""
+import logging
+import random
+import time
+from django.conf import settings
+from django.db import OperationalError, transaction
+from .locks import file_lock
+
+logger = logging.getLogger(__name__)
+
+WRITE_RETRIES = 5
+RETRY_BASE_DELAY = 0.05
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and 'locked' in str(exc).lower()
+
+
+def serialized_write(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) in a transaction while holding the database write lock.
+
+    Keep func short: no file copies or cleaning inside it. Retries with
+    backoff when SQLite raises "database is locked" and returns func's result.
+    """
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            start = time.monotonic()
+            with file_lock('db-write'):
+                waited_ms = (time.monotonic() - start) * 1000
+                if waited_ms >= settings.DB_LOCK_WAIT_LOG_MS:
+                    logger.info(f"waited {waited_ms:.1f} ms for the db-write lock", extra={'lock_wait_ms': round(waited_ms, 1)})
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+        except OperationalError as e:
+            if not is_lock_error(e) or attempt == WRITE_RETRIES or transaction.get_connection().in_atomic_block:
+                raise
+            delay = RETRY_BASE_DELAY * (2 ** attempt) * (1 + random.random())
+            logger.warning(f"database is locked; retrying write in {delay:.2f}s (attempt {attempt + 1})")
+            time.sleep(delay)
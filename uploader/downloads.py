@@ -0,0 +1,140 @@
+"""
+File responses for authenticated downloads.
+
+Supports conditional requests (ETag / Last-Modified), single byte ranges
+(206 / 416) and If-Range. When DOWNLOAD_ACCEL_MODE is set the body is left
+to the front proxy (nginx X-Accel-Redirect or Apache/lighttpd X-Sendfile),
+so the gunicorn thread is released immediately.
+"""
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Read-only view of `length` bytes of an open file starting at `start`."""
+
+    def __init__(self, f, start, length):
+        self.f = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # Lets gunicorn use sendfile(); it honours the Content-Length we set
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range header, None to ignore it, or False if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None  # malformed or multi-range: serve the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and int(mtime) <= since
+
+
+def accel_response(path, filename):
+    mode = getattr(settings, 'DOWNLOAD_ACCEL_MODE', '')
+    response = HttpResponse(content_type='application/octet-stream')
+    if mode == 'x-accel':
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = settings.DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative)
+    else:
+        response['X-Sendfile'] = path
+    response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    return response
+
+
+def serve_file(request, path, filename=None):
+    """Stream `path` as an attachment, honouring conditional and Range requests."""
+    filename = filename or os.path.basename(path)
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None and getattr(settings, 'DOWNLOAD_ACCEL_MODE', ''):
+        response = accel_response(path, filename)
+    if response is None:
+        size = stat.st_size
+        byte_range = None
+        if request.META.get('HTTP_RANGE') and if_range_matches(request, etag, stat.st_mtime):
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(
+                RangeFile(open(path, 'rb'), start, length), as_attachment=True, filename=filename, status=206
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+def serve_archived(request, archived):
+    """Stream a file that apply_retention moved into a month archive. Members are
+    decompressed on the fly, so whole-file responses only (no Range)."""
+    from .archive import open_archived
+
+    etag = f'"a{archived.id:x}-{archived.size:x}"'
+    last_modified = archived.archived_at.timestamp()
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is None:
+        member = open_archived(archived)
+        # RangeFile has no tell(), so FileResponse won't seek through the member to size it
+        response = FileResponse(
+            RangeFile(member, 0, archived.size), as_attachment=True,
+            filename=os.path.basename(archived.member),
+        )
+        response['Content-Length'] = str(archived.size)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
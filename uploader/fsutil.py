@@ -0,0 +1,37 @@
+"""
+Crash-safe file writes shared by everything that produces files under
+MEDIA_ROOT or the portal folder.
+"""
+import os
+import threading
+
+
+def fsync_dir(folder):
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path, write):
+    """
+    Call write(tmp_path) and rename the result over `path`.
+
+    Readers only ever see the old or the complete new file. The temp name
+    carries the pid and thread id, so concurrent writers of the same path
+    don't collide, and it is removed if write() fails. The file and its
+    folder are fsynced, so after a crash `path` is never half written.
+    """
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        fsync_dir(folder)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
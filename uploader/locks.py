@@ -0,0 +1,63 @@
+"""
+Advisory file locks under media/locks, shared by all worker processes.
+
+Locks are re-entrant within a thread: taking a lock the current thread
+already holds is a no-op, so helpers that lock can call each other.
+"""
+import fcntl
+import os
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+
+_held = threading.local()
+
+
+class LockTimeout(Exception):
+    """Raised when a lock could not be acquired within the requested timeout."""
+
+
+def lock_path(name):
+    safe = re.sub(r'[^\w.\-/]+', '_', name).strip('/')
+    return os.path.join(settings.MEDIA_ROOT, 'locks', safe + '.lock')
+
+
+@contextmanager
+def file_lock(name, timeout=None, poll=0.05):
+    """Hold an exclusive flock on media/locks/<name>.lock for the duration of the block."""
+    path = lock_path(name)
+    held = getattr(_held, 'names', None)
+    if held is None:
+        held = _held.names = set()
+    if path in held:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (fcntl.LOCK_NB if deadline else 0))
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"Timed out waiting for lock {name}")
+                time.sleep(poll)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def multi_lock(names, timeout=None):
+    """Hold several file locks, always taken in sorted order so callers cannot deadlock."""
+    with ExitStack() as stack:
+        for name in sorted(set(names)):
+            stack.enter_context(file_lock(name, timeout=timeout))
+        yield
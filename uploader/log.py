@@ -0,0 +1,182 @@
+"""
+Logging plumbing shared by all gunicorn workers.
+
+Request threads only put records on an in-memory queue (QueuedRotatingFileHandler);
+a listener thread per worker process writes them to a size-rotated file, holding
+an advisory lock so several processes can append to and rotate the same file.
+Records are JSON and carry the process / upload id set with `log_context`.
+"""
+import contextvars
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+_context = contextvars.ContextVar('upload_log_context', default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (e.g. process=..., upload_id=...) to every record logged inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current log_context onto the record while still in the calling thread."""
+
+    def filter(self, record):
+        ctx = _context.get()
+        if not hasattr(record, 'upload_process'):
+            record.upload_process = ctx.get('process')
+        if not hasattr(record, 'upload_id'):
+            record.upload_id = ctx.get('upload_id')
+        return True
+
+
+class LevelRateLimitFilter(logging.Filter):
+    """
+    Cap the number of records per level in each `period` seconds.
+
+    `limits` maps level names to a maximum (0 drops the level entirely);
+    levels not listed are unlimited.
+    """
+
+    def __init__(self, limits=None, period=60):
+        super().__init__()
+        self.limits = {logging.getLevelName(k.upper()) if isinstance(k, str) else k: v
+                       for k, v in (limits or {}).items()}
+        self.period = period
+        self._window = 0
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        limit = self.limits.get(record.levelno)
+        if limit is None:
+            return True
+        with self._lock:
+            window = int(time.monotonic() // self.period)
+            if window != self._window:
+                self._window = window
+                self._counts = {}
+            count = self._counts.get(record.levelno, 0)
+            if count >= limit:
+                return False
+            self._counts[record.levelno] = count + 1
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': getattr(record, 'upload_process', None),
+            'upload_id': getattr(record, 'upload_id', None),
+            'pid': record.process,
+        }
+        if hasattr(record, 'lock_wait_ms'):
+            payload['lock_wait_ms'] = record.lock_wait_ms
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class LockedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that takes an flock around each write so rotation is safe across processes."""
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8'):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+        self._lock_path = self.baseFilename + '.lock'
+        self._lock_file = None
+        self._lock_pid = None
+
+    def _acquire_file_lock(self):
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self._lock_path, 'a')
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def _reopen_if_rotated(self):
+        # Another process may have rotated the file since we opened it
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self.stream.fileno()).st_ino:
+            self.stream.close()
+            self.stream = None
+
+    def emit(self, record):
+        try:
+            self._acquire_file_lock()
+            try:
+                self._reopen_if_rotated()
+                if self.shouldRollover(record):
+                    self.doRollover()
+                logging.FileHandler.emit(self, record)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None and self._lock_pid == os.getpid():
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """
+    Non-blocking handler: records are formatted and queued in the caller's thread
+    and written by a background QueueListener. The listener is restarted after
+    fork so preloaded gunicorn workers each get their own writer thread.
+    """
+
+    def __init__(self, filename, max_bytes=20 * 1024 * 1024, backup_count=5, encoding='utf-8'):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.target = LockedRotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding
+        )
+        self.target.setFormatter(logging.Formatter('%(message)s'))
+        self.listener = None
+        self._pid = None
+        self._restart_lock = threading.Lock()
+        super().__init__(queue.SimpleQueue())
+        self._start_listener()
+
+    def _start_listener(self):
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            # The first records in a new worker may come from several threads at once
+            with self._restart_lock:
+                if self._pid != os.getpid():
+                    self._start_listener()
+        super().enqueue(record)
+
+    def close(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
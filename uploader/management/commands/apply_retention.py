@@ -0,0 +1,135 @@
+import os
+from collections import defaultdict
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.utils import timezone
+from uploader.archive import (
+    archive_files, archive_path, cutoffs, member_name, purge_archive, remove_source, source_path, upload_month,
+)
+from uploader.db import serialized_write
+from uploader.models import ArchivedFile, UploadedFile
+from uploader.registry import get_process_options
+
+KINDS = ('raw', 'clean')
+# Uploads whose file name is still empty after this long lost their file in store_upload
+ORPHAN_GRACE = timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    help = "Compress old uploads and cleaned files into monthly archives and purge months past the hard limit."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--process", action="append", help="Only this process (repeatable).")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Month archives written in parallel (default: CPU count).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be archived or purged.")
+
+    def handle(self, *args, **options):
+        processes = options["process"] or sorted(
+            set(get_process_options()) | set(UploadedFile.objects.exclude(process=None).values_list("process", flat=True).distinct())
+        )
+        now = timezone.now()
+        jobs, dropped, purged = {}, 0, 0
+        orphans = self.remove_orphans(processes, now, options["dry_run"])
+
+        for process in processes:
+            compress_before, purge_month = cutoffs(process, now)
+            if purge_month:
+                purged += self.purge(process, purge_month, now, options["dry_run"])
+            if compress_before is None:
+                continue
+            for (month, kind), uploads in self.candidates(process, compress_before).items():
+                entries = [(u, source_path(u, kind)) for u in uploads]
+                entries = [(u, path) for u, path in entries if os.path.isfile(path)]
+                if not entries:
+                    continue
+                if purge_month and month < purge_month:
+                    # Already past the hard limit: no point archiving just to delete
+                    dropped += len(entries)
+                    if not options["dry_run"]:
+                        self.drop(process, month, kind, entries, now)
+                    continue
+                jobs.setdefault((process, month), []).extend((u, kind, path) for u, path in entries)
+
+        if options["dry_run"]:
+            for (process, month), entries in sorted(jobs.items()):
+                self.stdout.write(f"{process} {month}: would archive {len(entries)} file(s)")
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run: {sum(map(len, jobs.values()))} to archive, {dropped} to delete, {purged} month(s) to purge, "
+                f"{orphans} upload row(s) without a file to remove."
+            ))
+            return
+
+        archived = self.archive(jobs, options["workers"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} file(s), deleted {dropped} past the purge limit, purged {purged} month archive(s), "
+            f"removed {orphans} upload row(s) without a file."
+        ))
+
+    def remove_orphans(self, processes, now, dry_run):
+        """Delete upload rows left without a file by a worker that died inside store_upload."""
+        orphans = UploadedFile.objects.filter(file='', process__in=processes, uploaded_at__lt=now - ORPHAN_GRACE)
+        count = orphans.count()
+        if count and not dry_run:
+            serialized_write(orphans.delete)
+        return count
+
+    def candidates(self, process, compress_before):
+        """{(month, kind): [UploadedFile]} not yet archived and uploaded before the cutoff."""
+        grouped = defaultdict(list)
+        uploads = UploadedFile.objects.filter(process=process, uploaded_at__lt=compress_before).exclude(file='').order_by("id")
+        for kind in KINDS:
+            for uf in uploads.exclude(archived_files__kind=kind).iterator():
+                grouped[(upload_month(uf), kind)].append(uf)
+        return grouped
+
+    def archive(self, jobs, workers):
+        """Write each (process, month) archive on its own thread; index and delete originals as each finishes."""
+        total = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(archive_files, process, month, [(path, member_name(u, kind, path)) for u, kind, path in entries]):
+                (process, month, entries)
+                for (process, month), entries in jobs.items()
+            }
+            for future in as_completed(futures):
+                process, month, entries = futures[future]
+                try:
+                    written = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"{process} {month}: archive failed: {e}"))
+                    continue
+                archive = os.path.relpath(archive_path(process, month), settings.MEDIA_ROOT)
+                rows = [
+                    ArchivedFile(uploaded_file=u, kind=kind, month=month, archive=archive, member=member, size=size)
+                    for (u, kind, path), (member, size) in zip(entries, written)
+                ]
+                serialized_write(ArchivedFile.objects.bulk_create, rows, ignore_conflicts=True)
+                for u, kind, path in entries:
+                    remove_source(path, kind)
+                total += len(rows)
+                self.stdout.write(f"{process} {month}: archived {len(rows)} file(s)")
+        return total
+
+    def drop(self, process, month, kind, entries, now):
+        rows = [ArchivedFile(uploaded_file=u, kind=kind, month=month, purged_at=now) for u, path in entries]
+        serialized_write(ArchivedFile.objects.bulk_create, rows, ignore_conflicts=True)
+        for u, path in entries:
+            remove_source(path, kind)
+
+    def purge(self, process, purge_month, now, dry_run):
+        """Delete month archives older than purge_month, keeping their index rows as tombstones."""
+        live = ArchivedFile.objects.filter(uploaded_file__process=process, purged_at=None, month__lt=purge_month)
+        months = sorted(set(live.values_list("month", flat=True)))
+        for month in months:
+            self.stdout.write(f"{process} {month}: {'would purge' if dry_run else 'purging'} archive")
+            if dry_run:
+                continue
+            purge_archive(process, month)
+            serialized_write(live.filter(month=month).update, purged_at=now)
+        return len(months)
+
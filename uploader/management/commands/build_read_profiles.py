@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from uploader.models import UploadedFile
+from uploader.profiles import load_profile, seed_profile, observe_upload, save_profile
+from uploader.registry import get_process_options
+from uploader.locks import file_lock
+from uploader.utils import load_upload
+
+
+class Command(BaseCommand):
+    help = "Seed per-process read profiles from the reference formats and refine them from past uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--process", action="append", help="Only this process (repeatable).")
+        parser.add_argument("--uploads", type=int, default=10, help="Recent uploads to learn from per process (default: 10).")
+        parser.add_argument("--reset", action="store_true", help="Discard existing profiles and start from the reference format.")
+
+    def handle(self, *args, **options):
+        processes = options["process"] or get_process_options()
+        for process in processes:
+            with file_lock(f"profile-{process}"):
+                profile = None if options["reset"] else load_profile(process)
+                profile = profile or seed_profile(process)
+
+                learned = 0
+                recent = UploadedFile.objects.filter(process=process).order_by("-uploaded_at")[:options["uploads"]]
+                for uf in reversed(list(recent)):
+                    try:
+                        # Read without the profile so every column is observed
+                        df = load_upload(uf.file.path, budget_mb=0)
+                    except Exception as e:
+                        self.stdout.write(self.style.WARNING(f"Skipping {uf.file.name}: {e}"))
+                        continue
+                    observe_upload(profile, df, uf.file.path)
+                    learned += 1
+
+                save_profile(profile)
+            self.stdout.write(
+                f"{process}: {len(profile['columns'])} columns, {learned} upload(s) learned, "
+                f"{len(profile['unused_columns'])} unused"
+            )
+        self.stdout.write(self.style.SUCCESS("Read profiles updated."))
@@ -0,0 +1,322 @@
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from uploader.paths import reference_format_path
+from uploader.registry import get_process_mapping, get_process_options
+
+USERNAME, PASSWORD = "loadtest", "loadtest-password"
+LOCK_RETRY_MARKER = "database is locked"
+
+SETUP_SCRIPT = r"""
+import django
+django.setup()
+from django.contrib.auth.models import User
+User.objects.filter(username=%r).exists() or User.objects.create_user(%r, password=%r)
+""" % (USERNAME, USERNAME, PASSWORD)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def synthetic_csv(process, day, rows, rng):
+    """A CSV in the process's reference format with `rows` plausible rows dated `day` of this month."""
+    import pandas as pd
+
+    columns = [str(c) for c in pd.read_excel(reference_format_path(process), engine="openpyxl", nrows=0).columns]
+    mapping = get_process_mapping(process) or {}
+    duration_cols = {mapping.get("login_col"), mapping.get("break_col")}
+    date = time.strftime("%m-%Y")
+    lines = [",".join(f'"{c}"' for c in columns)]
+    for i in range(rows):
+        values = []
+        for col in columns:
+            name = col.lower()
+            if col == mapping.get("first_login_col"):
+                values.append(f"{day:02d}-{date} {9 + i % 8:02d}:{i % 60:02d}:00")
+            elif col in duration_cols or "duration" in name:
+                values.append(f"00:{rng.randrange(60):02d}:{rng.randrange(60):02d}")
+            elif "date" in name:
+                values.append(f"{day:02d}-{date}")
+            elif "time" in name:
+                values.append(f"{9 + i % 8:02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}")
+            elif "agent" in name or "name" in name or "user" in name:
+                values.append(f"Agent {i % 25}")
+            else:
+                values.append(str(rng.randrange(100000)))
+        lines.append(",".join(values))
+    return ("\n".join(lines) + "\n").encode()
+
+
+class Client:
+    """One simulated user: a cookie jar, a login session and a CSRF token."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        return next((c.value for c in self.cookies if c.name == "csrftoken"), "")
+
+    def login(self):
+        self.opener.open(self.base_url + "/login/", timeout=self.timeout).read()
+        body = urlencode({"username": USERNAME, "password": PASSWORD, "csrfmiddlewaretoken": self.csrf_token()})
+        self.opener.open(Request(self.base_url + "/login/", data=body.encode()), timeout=self.timeout).read()
+
+    def upload(self, process, filename, payload):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in (("csrfmiddlewaretoken", self.csrf_token()), ("process", process)):
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode() + payload + b"\r\n"
+        )
+        parts.append(f"--{boundary}--\r\n".encode())
+        request = Request(
+            self.base_url + "/upload/", data=b"".join(parts),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        with self.opener.open(request, timeout=self.timeout) as response:
+            return response.status, response.read()
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn on a scratch copy of the app and drive concurrent uploads through it; "
+        "reports throughput, latency percentiles, errors, timeouts and DB lock retries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Gunicorn workers (default: 4).")
+        parser.add_argument("--threads", type=int, default=2, help="Gunicorn threads per worker (default: 2).")
+        parser.add_argument("--timeout", type=int, default=60, help="Gunicorn worker timeout in seconds (default: 60).")
+        parser.add_argument("--concurrency", type=int, default=8, help="Simultaneous clients (default: 8).")
+        parser.add_argument("--uploads", type=int, default=100, help="Total uploads to send (default: 100).")
+        parser.add_argument("--rows", type=int, default=2000, help="Rows per synthetic file (default: 2000).")
+        parser.add_argument(
+            "--mix", default="",
+            help="Weighted processes, e.g. 'JIO=3,HDFC=1' (default: every process with a reference format, equally).",
+        )
+        parser.add_argument("--client-timeout", type=float, default=90, help="Seconds before a client gives up (default: 90).")
+        parser.add_argument("--seed", type=int, default=1, help="Seed for the upload mix and file contents (default: 1).")
+        parser.add_argument("--port", type=int, default=0, help="Port to bind (default: any free port).")
+        parser.add_argument("--json", help="Also write the results to this file.")
+        parser.add_argument("--keep", action="store_true", help="Keep the scratch media, database and logs.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        mix = self.parse_mix(options["mix"])
+        plan = rng.choices(list(mix), weights=list(mix.values()), k=options["uploads"])
+
+        # Payloads are built up front so generation isn't part of the timings
+        payloads = {}
+        for i, process in enumerate(plan):
+            day = i % 28 + 1
+            if (process, day) not in payloads:
+                payloads[(process, day)] = synthetic_csv(process, day, options["rows"], rng)
+        jobs = [(process, f"load_{i:05d}.csv", payloads[(process, i % 28 + 1)]) for i, process in enumerate(plan)]
+
+        scratch = tempfile.mkdtemp(prefix="upload-loadtest-")
+        server = None
+        try:
+            env = self.prepare(scratch)
+            port = options["port"] or self.free_port()
+            with open(os.path.join(scratch, "gunicorn.log"), "w") as server_log:
+                server = subprocess.Popen(
+                    [
+                        sys.executable, "-m", "gunicorn", "Disposition_Uploads.wsgi:application",
+                        "--bind", f"127.0.0.1:{port}", "--workers", str(options["workers"]),
+                        "--threads", str(options["threads"]), "--timeout", str(options["timeout"]),
+                    ],
+                    cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=server_log,
+                )
+            base_url = f"http://127.0.0.1:{port}"
+            self.wait_until_up(base_url, server)
+            results, elapsed = self.drive(base_url, jobs, options["concurrency"], options["client_timeout"])
+            if server.poll() is None:
+                server.terminate()
+                server.wait(timeout=30)
+
+            report = self.summarise(results, elapsed, scratch, options)
+            self.print_report(report)
+            if options["json"]:
+                with open(options["json"], "w") as f:
+                    json.dump(report, f, indent=2)
+        finally:
+            if server is not None and server.poll() is None:
+                server.kill()
+            if options["keep"]:
+                self.stdout.write(f"Scratch files kept in {scratch}")
+            else:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+    def parse_mix(self, spec):
+        available = [p for p in get_process_options() if os.path.exists(reference_format_path(p)) and get_process_mapping(p)]
+        if not spec:
+            if not available:
+                raise CommandError("No process has both a mapping row and a reference format.")
+            return {p: 1 for p in available}
+        mix = {}
+        for item in spec.split(","):
+            name, _, weight = item.partition("=")
+            name = name.strip()
+            if name not in available:
+                raise CommandError(f"Unknown process or missing reference format: {name}")
+            mix[name] = float(weight or 1)
+        return mix
+
+    def prepare(self, scratch):
+        """Scratch media (registries and reference formats only), database and portal; returns the server env."""
+        media = os.path.join(scratch, "media")
+        for folder in ("Map", "process", "reference"):
+            shutil.copytree(os.path.join(settings.MEDIA_ROOT, folder), os.path.join(media, folder))
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "Disposition_Uploads.settings"),
+            MEDIA_ROOT=media,
+            SQLITE_PATH=os.path.join(scratch, "db.sqlite3"),
+            PORTAL_DATA_ROOT=os.path.join(scratch, "portal"),
+            # Failure digests are only queued by the web workers; never send real mail from a load test
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            LOG_DIR=os.path.join(media, "logs"),
+            # Every db-write lock wait, unthrottled, for the contention figures
+            DB_LOCK_WAIT_LOG_MS="0",
+            LOG_INFO_PER_MINUTE=str(10 ** 9),
+        )
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, "manage.py")]
+        subprocess.run(manage + ["migrate", "--verbosity", "0"], cwd=settings.BASE_DIR, env=env, check=True)
+        subprocess.run([sys.executable, "-c", SETUP_SCRIPT], cwd=settings.BASE_DIR, env=env, check=True)
+        return env
+
+    def free_port(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def wait_until_up(self, base_url, server, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with status {server.returncode}")
+            try:
+                build_opener().open(base_url + "/login/", timeout=2).read()
+                return
+            except (URLError, OSError):
+                time.sleep(0.2)
+        raise CommandError("gunicorn did not start in time")
+
+    def drive(self, base_url, jobs, concurrency, client_timeout):
+        """Run `jobs` from `concurrency` logged-in clients; returns ([(outcome, seconds)], wall seconds)."""
+        pending = list(reversed(jobs))
+        lock = threading.Lock()
+        results = []
+        clients = [Client(base_url, client_timeout) for _ in range(concurrency)]
+        for client in clients:
+            client.login()
+
+        def run(client):
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    process, filename, payload = pending.pop()
+                start = time.perf_counter()
+                try:
+                    status, body = client.upload(process, filename, payload)
+                    outcome = "ok" if b"cleaned successfully" in body else "not_cleaned"
+                except HTTPError as e:
+                    outcome = f"http_{e.code}"
+                except (socket.timeout, TimeoutError):
+                    outcome = "timeout"
+                except URLError as e:
+                    outcome = "timeout" if isinstance(e.reason, (socket.timeout, TimeoutError)) else "connection_error"
+                except OSError:
+                    outcome = "connection_error"
+                with lock:
+                    results.append((outcome, time.perf_counter() - start))
+
+        threads = [threading.Thread(target=run, args=(client,)) for client in clients]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, time.perf_counter() - start
+
+    def summarise(self, results, elapsed, scratch, options):
+        latencies = sorted(seconds for outcome, seconds in results)
+        outcomes = Counter(outcome for outcome, seconds in results)
+        total = len(results) or 1
+        lock_retries, lock_waits = 0, []
+        log_dir = os.path.join(scratch, "media", "logs")
+        for name in os.listdir(log_dir) if os.path.isdir(log_dir) else []:
+            if name.startswith("cleaning_errors.log") and not name.endswith(".lock"):
+                with open(os.path.join(log_dir, name), errors="replace") as f:
+                    for line in f:
+                        lock_retries += LOCK_RETRY_MARKER in line
+                        if '"lock_wait_ms"' in line:
+                            lock_waits.append(json.loads(line)["lock_wait_ms"])
+        lock_waits.sort()
+        return {
+            "config": {k: options[k] for k in ("workers", "threads", "timeout", "concurrency", "uploads", "rows", "mix", "seed")},
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(len(results) / elapsed, 3) if elapsed else 0.0,
+            "latency_ms": {
+                p: round(percentile(latencies, n) * 1000, 1) for p, n in (("p50", 50), ("p95", 95), ("p99", 99))
+            } | {"max": round(latencies[-1] * 1000, 1) if latencies else 0.0},
+            "outcomes": dict(outcomes),
+            "error_rate": round(1 - outcomes["ok"] / total, 4),
+            "timeout_rate": round(outcomes["timeout"] / total, 4),
+            "db_lock_retries": lock_retries,
+            # Time writers spent queued on the db-write lock in serialized_write
+            "db_lock_wait": {
+                "writes": len(lock_waits),
+                "p95_ms": round(percentile(lock_waits, 95), 1),
+                "max_ms": round(lock_waits[-1], 1) if lock_waits else 0.0,
+                "total_ms": round(sum(lock_waits), 1),
+            },
+        }
+
+    def print_report(self, report):
+        c = report["config"]
+        self.stdout.write(
+            f"gunicorn {c['workers']} worker(s) x {c['threads']} thread(s), {c['concurrency']} client(s), "
+            f"{c['uploads']} upload(s) of {c['rows']} rows"
+        )
+        self.stdout.write(f"  elapsed          {report['elapsed_s']:.1f} s")
+        self.stdout.write(f"  throughput       {report['throughput_per_s']:.2f} uploads/s")
+        latency = report["latency_ms"]
+        self.stdout.write(
+            f"  latency ms       p50 {latency['p50']:.0f}  p95 {latency['p95']:.0f}  "
+            f"p99 {latency['p99']:.0f}  max {latency['max']:.0f}"
+        )
+        self.stdout.write(f"  outcomes         {', '.join(f'{k}={v}' for k, v in sorted(report['outcomes'].items()))}")
+        self.stdout.write(f"  error rate       {report['error_rate']:.2%} (timeouts {report['timeout_rate']:.2%})")
+        self.stdout.write(f"  db lock retries  {report['db_lock_retries']}")
+        wait = report["db_lock_wait"]
+        self.stdout.write(
+            f"  db lock wait ms  {wait['writes']} write(s), p95 {wait['p95_ms']:.1f}  "
+            f"max {wait['max_ms']:.1f}  total {wait['total_ms']:.0f}"
+        )
@@ -0,0 +1,87 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from uploader.db import serialized_write
+from uploader.models import UploadedFile, upload_to_process_folder
+from uploader.paths import cleaned_path, cleaned_path_for, prune_empty_dirs
+from uploader.preview import index_path
+
+
+class Command(BaseCommand):
+    help = "Move uploads and cleaned files into the STORAGE_LAYOUT folders and update their paths in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--process", action="append", help="Only this process (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows read and updated per query (default: 500).")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would move.")
+
+    def handle(self, *args, **options):
+        # Rows still being stored by the upload view have no file name yet
+        uploads = UploadedFile.objects.exclude(process=None).exclude(file='').order_by("id")
+        if options["process"]:
+            uploads = uploads.filter(process__in=options["process"])
+        batch_size = max(1, options["batch_size"])
+
+        moved, conflicts, last_id = 0, 0, 0
+        while True:
+            batch = list(uploads.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            changed = []
+            for uf in batch:
+                raw_name, clean_path = self.targets(uf)
+                if raw_name == uf.file.name and clean_path == cleaned_path_for(uf):
+                    continue
+                if options["dry_run"]:
+                    self.stdout.write(f"{uf.process} #{uf.id}: {uf.file.name} -> {raw_name}")
+                    moved += 1
+                elif self.relocate(uf, raw_name, clean_path):
+                    changed.append(uf)
+                else:
+                    self.stdout.write(self.style.WARNING(f"{uf.process} #{uf.id}: target exists, left in place"))
+                    conflicts += 1
+            if changed:
+                # Files first, then their paths: a rerun picks up rows whose files already moved
+                serialized_write(UploadedFile.objects.bulk_update, changed, ["file", "cleaned_file"], batch_size=batch_size)
+                moved += len(changed)
+            self.stdout.write(f"... up to #{last_id}: {moved} moved")
+
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {moved} upload(s) to the '{settings.STORAGE_LAYOUT}' layout, {conflicts} left in place."
+        ))
+        orphans = UploadedFile.objects.filter(file='').count()
+        if orphans:
+            self.stdout.write(self.style.WARNING(
+                f"{orphans} upload row(s) have no file yet; apply_retention removes them once they are an hour old."
+            ))
+
+    def targets(self, uf):
+        """(raw file name, cleaned CSV path) for `uf` in the configured layout."""
+        raw_name = upload_to_process_folder(uf, os.path.basename(uf.file.name))
+        # Keep the cleaned file's own name: it is also its name on the portal
+        clean_dir = os.path.dirname(cleaned_path(uf.process, raw_name))
+        return raw_name, os.path.join(clean_dir, os.path.basename(cleaned_path_for(uf)))
+
+    def relocate(self, uf, raw_name, clean_path):
+        """Move the raw file, cleaned CSV and its row index; False, moving nothing, if a target is taken."""
+        old_clean = cleaned_path_for(uf)
+        moves = [
+            (uf.file.path, os.path.join(settings.MEDIA_ROOT, raw_name), 'uploads'),
+            (old_clean, clean_path, 'clean'),
+            (index_path(old_clean), index_path(clean_path), 'clean'),
+        ]
+        moves = [m for m in moves if m[0] != m[1]]
+        if any(os.path.exists(source) and os.path.exists(target) for source, target, _ in moves):
+            return False
+        for source, target, root in moves:
+            # Missing sources were moved by an interrupted run, or archived
+            if os.path.exists(source):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+                prune_empty_dirs(source, os.path.join(settings.MEDIA_ROOT, root))
+        uf.file.name = raw_name
+        if uf.cleaned_file:
+            uf.cleaned_file = os.path.relpath(clean_path, settings.MEDIA_ROOT)
+        return True
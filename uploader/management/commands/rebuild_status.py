@@ -4,7 +4,7 @@ import datetime
 import logging
 from django.core.management.base import BaseCommand
 from uploader.models import UploadedFile, UploadStatus
-from django.conf import settings
+from uploader.paths import cleaned_path_for
 
 
 class Command(BaseCommand):
@@ -17,20 +17,15 @@ class Command(BaseCommand):
         count = 0
         failed = 0
 
-        for uf in UploadedFile.objects.all():
+        # Rows still being stored by the upload view have no file name yet
+        for uf in UploadedFile.objects.exclude(file='').iterator():
             process = uf.process
             file_path = uf.file.path
-            cleaned_dir = os.path.join(settings.MEDIA_ROOT, "clean", process, "APR_Clean")
 
-            # try to find cleaned file corresponding to this upload
-            cleaned_file = None
-            if os.path.exists(cleaned_dir):
-                for f in os.listdir(cleaned_dir):
-                    if os.path.splitext(os.path.basename(file_path))[0] in f:
-                        cleaned_file = os.path.join(cleaned_dir, f)
-                        break
+            # cleaned file recorded for this upload (or its pre-upload-id name)
+            cleaned_file = cleaned_path_for(uf)
 
-            if not cleaned_file or not os.path.exists(cleaned_file):
+            if not os.path.exists(cleaned_file):
                 self.stdout.write(self.style.WARNING(f"⚠️ No cleaned file found for {process} ({file_path})"))
                 failed += 1
                 continue
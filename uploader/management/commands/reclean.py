@@ -0,0 +1,120 @@
+import datetime
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connections
+from uploader.db import serialized_write
+from uploader.models import UploadedFile
+from uploader.publish import record_dates_bulk
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def reclean_upload(upload_id, process, file_path, legacy_output, fingerprint, force):
+    """
+    Runs in a pool worker: re-clean one upload unless its fingerprint is current,
+    then publish it. Returns (upload_id, state, message, cleaned_path, fingerprint, dates).
+    """
+    from uploader.log import log_context
+    from uploader.publish import cleaned_dates, publish_to_portal
+    from uploader.utils import clean, clean_fingerprint
+
+    current = clean_fingerprint(file_path)
+    if current == fingerprint and not force:
+        return upload_id, 'current', '', None, current, []
+
+    with log_context(process=process, upload_id=upload_id):
+        # Uploads cleaned before outputs carried the upload id keep their old name,
+        # so the portal copy is replaced rather than duplicated. Old files don't
+        # retrain the read profile, and minutes only change for dates this upload owns.
+        success, msg, path = clean(file_path, process, upload_id=upload_id, legacy_output=legacy_output, learn=False)
+        if not success:
+            return upload_id, 'failed', msg, None, '', []
+        dates, _ = cleaned_dates(path)
+        try:
+            publish_to_portal(process, path, upload_id=upload_id)
+        except Exception as e:
+            return upload_id, 'unpublished', f"Could not publish: {e}", path, current, dates
+    return upload_id, 'recleaned', '', path, current, dates
+
+
+class Command(BaseCommand):
+    help = "Re-clean past uploads whose cleaned file predates the current rules or input, and republish them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--process", action="append", help="Only this process (repeatable).")
+        parser.add_argument("--from", dest="date_from", help="Uploaded on or after YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", help="Uploaded on or before YYYY-MM-DD.")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Cleaning processes to run in parallel (default: CPU count).",
+        )
+        parser.add_argument("--force", action="store_true", help="Re-clean even if the fingerprint is current.")
+
+    def handle(self, *args, **options):
+        uploads = UploadedFile.objects.exclude(process=None).exclude(file='').order_by("id")
+        if options["process"]:
+            uploads = uploads.filter(process__in=options["process"])
+        for key, lookup in (("date_from", "uploaded_at__date__gte"), ("date_to", "uploaded_at__date__lte")):
+            if options[key]:
+                try:
+                    uploads = uploads.filter(**{lookup: datetime.date.fromisoformat(options[key])})
+                except ValueError:
+                    raise CommandError(f"--{key[5:]} must be YYYY-MM-DD")
+
+        selected, missing = [], 0
+        for uf in uploads:
+            if not os.path.isfile(uf.file.path):
+                missing += 1  # archived or purged by apply_retention
+                continue
+            selected.append(uf)
+        self.stdout.write(f"{len(selected)} upload(s) selected, {missing} skipped without a raw file.")
+
+        # Workers open their own connections; don't hand them ours
+        connections.close_all()
+        by_id = {uf.id: uf for uf in selected}
+        counts = defaultdict(int)
+        changed, dates_by_process = [], defaultdict(dict)
+        with ProcessPoolExecutor(max_workers=max(1, options["workers"]), initializer=init_worker) as pool:
+            futures = {
+                pool.submit(
+                    reclean_upload, uf.id, uf.process, uf.file.path, not uf.cleaned_file,
+                    uf.clean_fingerprint, options["force"],
+                ): uf.id
+                for uf in selected
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    upload_id, state, msg, path, fingerprint, dates = future.result()
+                except Exception as e:
+                    # Keep going: uploads already re-cleaned still get their new paths saved
+                    upload_id, state, msg, path = futures[future], 'failed', f"{type(e).__name__}: {e}", None
+                    logger.error(f"Re-cleaning upload {upload_id} failed", exc_info=e)
+                counts[state] += 1
+                uf = by_id[upload_id]
+                if msg:
+                    self.stdout.write(self.style.WARNING(f"{uf.process} #{upload_id} {uf.file.name}: {msg}"))
+                if path:
+                    uf.cleaned_file = os.path.relpath(path, settings.MEDIA_ROOT)
+                    uf.clean_fingerprint = fingerprint
+                    changed.append(uf)
+                    dates_by_process[uf.process][upload_id] = dates
+                if done % 100 == 0:
+                    self.stdout.write(f"{done}/{len(futures)} done")
+
+        serialized_write(UploadedFile.objects.bulk_update, changed, ["cleaned_file", "clean_fingerprint"], batch_size=500)
+        statuses = sum(record_dates_bulk(process, dates) for process, dates in dates_by_process.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-cleaned {counts['recleaned'] + counts['unpublished']}, {counts['current']} already current, "
+            f"{counts['failed']} failed, {counts['unpublished']} not published; {statuses} status(es) refreshed."
+        ))
+        if counts['failed']:
+            raise CommandError(f"{counts['failed']} upload(s) could not be re-cleaned.")
@@ -0,0 +1,74 @@
+import time
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.core.mail import EmailMessage, get_connection
+from django.conf import settings
+from django.utils import timezone
+from uploader.db import serialized_write
+from uploader.models import FailureNotification
+
+
+class Command(BaseCommand):
+    help = "Send queued cleaning-failure notifications as one digest email per process."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=int, default=0,
+            help="Keep running and flush the outbox every N seconds (default: flush once and exit).",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            sent = self.flush()
+            self.stdout.write(self.style.SUCCESS(f"Sent {sent} failure digest(s)."))
+            if not interval:
+                break
+            time.sleep(interval)
+
+    def flush(self):
+        claimed_at = timezone.now()
+
+        def claim():
+            # Mark the rows before mailing, so failures queued while we send open new rows
+            pending = list(FailureNotification.objects.filter(sent_at__isnull=True).order_by("process", "first_seen"))
+            FailureNotification.objects.filter(id__in=[note.id for note in pending]).update(sent_at=claimed_at)
+            return pending
+
+        pending = serialized_write(claim)
+        if not pending:
+            return 0
+
+        # Fold anything that slipped in twice for the same (process, reason)
+        by_process = defaultdict(dict)
+        for note in pending:
+            entry = by_process[note.process].setdefault(note.reason, {"count": 0, "files": [], "ids": []})
+            entry["count"] += note.occurrences
+            entry["files"].extend(note.files.splitlines())
+            entry["ids"].append(note.id)
+
+        recipients = getattr(settings, "FAILURE_EMAIL_RECIPIENTS", [settings.DEFAULT_FROM_EMAIL])
+        messages, ids = [], []
+        for process, reasons in by_process.items():
+            total = sum(entry["count"] for entry in reasons.values())
+            lines = []
+            for reason, entry in reasons.items():
+                lines.append(f"{reason} (x{entry['count']})")
+                lines.extend(f"    {f}" for f in entry["files"])
+                ids.extend(entry["ids"])
+            messages.append(EmailMessage(
+                f"Cleaning Failed - {process} ({total} failure{'s' if total != 1 else ''})",
+                "\n".join(lines),
+                settings.DEFAULT_FROM_EMAIL,
+                recipients,
+            ))
+
+        # One connection for the whole batch
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.send_messages(messages)
+        except Exception:
+            # Back into the outbox for the next flush
+            serialized_write(FailureNotification.objects.filter(id__in=ids, sent_at=claimed_at).update, sent_at=None)
+            raise
+        return len(messages)
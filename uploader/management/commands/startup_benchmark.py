@@ -0,0 +1,102 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter: boot the WSGI app, serve the login page once,
+# then time the first import of the cleaning code.
+CHILD_SCRIPT = r"""
+import os, sys, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Disposition_Uploads.settings")
+from wsgiref.util import setup_testing_defaults
+from Disposition_Uploads.wsgi import application
+if sys.argv[1] == "eager":
+    from uploader.startup import preload
+    preload()
+environ = {"PATH_INFO": "/login/"}
+setup_testing_defaults(environ)
+b"".join(application(environ, lambda status, headers: None))
+print("ready", flush=True)
+t = time.perf_counter()
+import uploader.utils
+print("clean-import", time.perf_counter() - t, flush=True)
+"""
+
+
+def serve_login(application):
+    from wsgiref.util import setup_testing_defaults
+    environ = {"PATH_INFO": "/login/"}
+    setup_testing_defaults(environ)
+    b"".join(application(environ, lambda status, headers: None))
+
+
+class Command(BaseCommand):
+    help = "Measure worker cold-start and recycle latency (time until the login page is served)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Samples per scenario (default: 5).")
+
+    def handle(self, *args, **options):
+        runs = options["runs"]
+        results = {}
+
+        for mode in ("lazy", "eager"):
+            ready, clean_import = [], []
+            for _ in range(runs):
+                r, c = self.cold_start(mode)
+                ready.append(r)
+                clean_import.append(c)
+            results[f"cold start, {mode} imports"] = ready
+            if mode == "lazy":
+                results["first clean import after lazy start"] = clean_import
+
+        if hasattr(os, "fork"):
+            results["worker recycle (fork from preloaded master)"] = [self.forked_start() for _ in range(runs)]
+
+        self.stdout.write(f"{'scenario':<48} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+        for name, samples in results.items():
+            ms = [s * 1000 for s in samples]
+            self.stdout.write(f"{name:<48} {statistics.median(ms):>10.1f} {min(ms):>10.1f} {max(ms):>10.1f}")
+
+    def cold_start(self, mode):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "Disposition_Uploads.settings"))
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-c", CHILD_SCRIPT, mode],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, text=True,
+        )
+        ready = clean_import = None
+        for line in proc.stdout:
+            if line.startswith("ready"):
+                ready = time.perf_counter() - start
+            elif line.startswith("clean-import"):
+                clean_import = float(line.split()[1])
+        proc.wait()
+        if proc.returncode or ready is None:
+            raise RuntimeError(f"Benchmark child exited with status {proc.returncode}")
+        return ready, clean_import
+
+    def forked_start(self):
+        from Disposition_Uploads.wsgi import application
+        from uploader.startup import preload
+        preload()
+
+        read_fd, write_fd = os.pipe()
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                serve_login(application)
+                os.write(write_fd, b"1")
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        os.read(read_fd, 1)
+        elapsed = time.perf_counter() - start
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        return elapsed
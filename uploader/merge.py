@@ -0,0 +1,115 @@
+"""
+Incremental merge of overlapping uploads, for processes listed in MERGE_KEYS.
+
+Every cleaned row gets a key -- the process's key columns plus its ordinal
+among rows sharing those values -- and a hash of its contents. An index per
+process/date under media/merge records what was last published for that
+date, so a re-upload publishes only rows that are new or changed, and the
+consolidated file for a date is rewritten only when that date changed.
+
+The newest upload (highest id) covering a date is authoritative for it:
+rows it no longer contains drop out of the consolidated file, and an older
+upload merged later (e.g. by reclean) leaves the date alone.
+"""
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .fsutil import write_atomic
+from .locks import multi_lock
+from .publish import portal_dir, status_lock_names
+
+logger = logging.getLogger(__name__)
+
+
+def merge_enabled(process_name):
+    return process_name in getattr(settings, 'MERGE_KEYS', {})
+
+
+def key_columns(process_name, columns):
+    """Configured key columns present in `columns`; by default the agent column and Raw Date."""
+    configured = settings.MERGE_KEYS.get(process_name)
+    if configured is None:
+        from .utils import find_agent_column
+        configured = [find_agent_column(columns), 'Raw Date']
+    return [c for c in configured if c in columns]
+
+
+def index_path(process_name, date):
+    return os.path.join(settings.MEDIA_ROOT, 'merge', process_name, f'{date.isoformat()}.json')
+
+
+def consolidated_path(process_name, portal_name, date):
+    # Next to APR_Clean rather than inside it, so readers of APR_Clean don't count these rows twice
+    folder = os.path.join(os.path.dirname(portal_dir(process_name)), 'APR_Consolidated')
+    return os.path.join(folder, f"{portal_name}%{date.isoformat()}.csv")
+
+
+def load_index(process_name, date):
+    try:
+        with open(index_path(process_name, date)) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    data['rows'] = dict(zip(data.pop('keys'), data.pop('hashes')))
+    return data
+
+
+def save_index(process_name, date, upload_id, columns, keys, hashes):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump({'upload_id': upload_id, 'columns': columns, 'keys': keys, 'hashes': hashes}, f)
+    write_atomic(index_path(process_name, date), write)
+
+
+def row_hashes(df, keys):
+    """(key hash, row hash) per row as lists of ints."""
+    ordinal = df.groupby(keys, sort=False, dropna=False).cumcount() if keys else pd.Series(range(len(df)), index=df.index)
+    key_hash = pd.util.hash_pandas_object(df[keys].assign(_ordinal=ordinal), index=False)
+    row_hash = pd.util.hash_pandas_object(df, index=False)
+    return key_hash.tolist(), row_hash.tolist()
+
+
+def merge_upload(process_name, portal_name, cleaned_file_path, upload_id):
+    """
+    Merge a cleaned CSV into the per-date indexes and consolidated files.
+    Returns the delta (new or changed rows, plus rows without a valid Raw Date) as a DataFrame.
+    """
+    df = pd.read_csv(cleaned_file_path, dtype=str, keep_default_na=False)
+    columns = list(df.columns)
+    keys = key_columns(process_name, columns)
+    key_hash, row_hash = row_hashes(df, keys)
+    if 'Raw Date' in df.columns:
+        dates = pd.to_datetime(df['Raw Date'], format='%d-%m-%Y', errors='coerce')
+    else:
+        dates = pd.Series(pd.NaT, index=df.index)
+    publish = dates.isna().to_numpy()
+
+    groups = {d.date(): idx for d, idx in df.groupby(dates, sort=True).indices.items()}
+    changed_dates = 0
+    with multi_lock(status_lock_names(process_name, groups)):
+        for date, positions in groups.items():
+            index = load_index(process_name, date)
+            if index and index['upload_id'] > upload_id:
+                continue
+            part_keys = [key_hash[i] for i in positions]
+            part_hashes = [row_hash[i] for i in positions]
+            known = index['rows'] if index and index['columns'] == columns else {}
+            changed = np.fromiter((known.get(k) != h for k, h in zip(part_keys, part_hashes)), bool, len(positions))
+            removed = len(known) - sum(1 for k in part_keys if k in known)
+            publish[positions[changed]] = True
+
+            if changed.any() or removed or not index or index['columns'] != columns:
+                changed_dates += 1
+                path = consolidated_path(process_name, portal_name, date)
+                write_atomic(path, lambda tmp: df.iloc[positions].to_csv(tmp, index=False))
+            # Always record the new owner, so an older upload can't take the date back
+            save_index(process_name, date, upload_id, columns, part_keys, part_hashes)
+
+    logger.info(
+        f"Merged upload {upload_id} for {process_name}: {int(publish.sum())} of {len(df)} rows new or changed, "
+        f"{changed_dates} of {len(groups)} date(s) rewritten"
+    )
+    return df[publish]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploader', '0007_uploadstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentDailyMinutes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('agent', models.CharField(blank=True, default='', max_length=255)),
+                ('minutes', models.IntegerField(default=0)),
+                ('row_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Agent daily minutes',
+                'ordering': ['-date', 'process', 'agent'],
+                'unique_together': {('process', 'date', 'agent')},
+            },
+        ),
+    ]
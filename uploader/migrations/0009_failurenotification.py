@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploader', '0008_agentdailyminutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailureNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process', models.CharField(max_length=100)),
+                ('reason', models.CharField(max_length=255)),
+                ('files', models.TextField(blank=True, default='')),
+                ('occurrences', models.PositiveIntegerField(default=1)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+                ('sent_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'ordering': ['-last_seen'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploader', '0009_failurenotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='cleaned_file',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
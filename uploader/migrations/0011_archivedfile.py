@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploader', '0010_uploadedfile_cleaned_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('raw', 'Raw upload'), ('clean', 'Cleaned CSV')], max_length=10)),
+                ('month', models.CharField(max_length=7)),
+                ('archive', models.CharField(blank=True, default='', max_length=500)),
+                ('member', models.CharField(blank=True, default='', max_length=500)),
+                ('size', models.BigIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('purged_at', models.DateTimeField(blank=True, null=True)),
+                ('uploaded_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_files', to='uploader.uploadedfile')),
+            ],
+            options={
+                'ordering': ['-archived_at'],
+                'unique_together': {('uploaded_file', 'kind')},
+            },
+        ),
+    ]
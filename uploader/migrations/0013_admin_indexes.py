@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploader', '0012_uploadedfile_clean_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['uploaded_at'], name='uploader_up_uploade_a45ad7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['process', 'uploaded_at'], name='uploader_up_process_bfebde_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['user', 'uploaded_at'], name='uploader_up_user_id_e043d8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadstatus',
+            index=models.Index(fields=['date'], name='uploader_up_date_292c07_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadstatus',
+            index=models.Index(fields=['status', 'date'], name='uploader_up_status_b66298_idx'),
+        ),
+    ]
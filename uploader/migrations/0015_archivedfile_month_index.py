@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploader', '0014_agentdailyminutes_uploaded_file'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedfile',
+            index=models.Index(fields=['month'], name='uploader_ar_month_db7fd2_idx'),
+        ),
+    ]
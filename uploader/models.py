@@ -1,8 +1,13 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 import os
+from .paths import upload_partition
 
 def upload_to_process_folder(instance, filename):
+    # Date layout: uploads/<process>/YYYY/MM/DD/<id>/<name>, so the row is saved before the file
+    if settings.STORAGE_LAYOUT == 'date' and instance.pk:
+        return os.path.join('uploads', instance.process, *upload_partition(instance).split('/'), filename)
     return os.path.join('uploads', instance.process, filename)
 
 class UploadedFile(models.Model):
@@ -10,6 +15,17 @@ class UploadedFile(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)  # Link file to the user
     process = models.CharField(max_length=100, null=True, blank=True)
+    # Cleaned CSV written for this upload, relative to MEDIA_ROOT
+    cleaned_file = models.CharField(max_length=500, blank=True, default='')
+    # Rules version and input hash the cleaned file was produced from (see utils.clean_fingerprint)
+    clean_fingerprint = models.CharField(max_length=80, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_at']),
+            models.Index(fields=['process', 'uploaded_at']),
+            models.Index(fields=['user', 'uploaded_at']),
+        ]
 
     def __str__(self):
         return f"{self.process} - {self.file.name}"
@@ -37,6 +53,70 @@ class UploadStatus(models.Model):
     class Meta:
         unique_together = ('process', 'date')  # ensure one record per process/date
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['status', 'date']),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.process}: {self.status}"
+
+class AgentDailyMinutes(models.Model):
+    """Per-agent, per-day minutes (login minus break) computed while cleaning."""
+    process = models.CharField(max_length=100)
+    date = models.DateField()
+    agent = models.CharField(max_length=255, blank=True, default='')
+    minutes = models.IntegerField(default=0)
+    row_count = models.IntegerField(default=0)
+    # Upload the totals came from; like UploadStatus, the newest upload owns a date
+    uploaded_file = models.ForeignKey(
+        'UploadedFile', on_delete=models.SET_NULL, null=True, blank=True, related_name='minutes_entries'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('process', 'date', 'agent')  # also serves process/date range lookups
+        ordering = ['-date', 'process', 'agent']
+        verbose_name_plural = 'Agent daily minutes'
+
+    def __str__(self):
+        return f"{self.date} - {self.process} - {self.agent}: {self.minutes}"
+
+class FailureNotification(models.Model):
+    """Outbox entry for a cleaning failure; repeats of the same (process, reason) are folded together until sent."""
+    process = models.CharField(max_length=100)
+    reason = models.CharField(max_length=255)
+    files = models.TextField(blank=True, default='')  # newline separated, capped
+    occurrences = models.PositiveIntegerField(default=1)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['-last_seen']
+
+    def __str__(self):
+        return f"{self.process}: {self.reason} (x{self.occurrences})"
+
+class ArchivedFile(models.Model):
+    """Where a raw upload or cleaned CSV went after apply_retention moved it off the live tree."""
+    KIND_CHOICES = [('raw', 'Raw upload'), ('clean', 'Cleaned CSV')]
+
+    uploaded_file = models.ForeignKey('UploadedFile', on_delete=models.CASCADE, related_name='archived_files')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    month = models.CharField(max_length=7)  # YYYY-MM of uploaded_at, names the archive
+    archive = models.CharField(max_length=500, blank=True, default='')  # zip relative to MEDIA_ROOT
+    member = models.CharField(max_length=500, blank=True, default='')
+    size = models.BigIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    purged_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('uploaded_file', 'kind')
+        ordering = ['-archived_at']
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+
+    def __str__(self):
+        return f"{self.uploaded_file_id} {self.kind} -> {self.archive}:{self.member}"
@@ -0,0 +1,76 @@
+"""
+Where raw uploads and their cleaned outputs live under MEDIA_ROOT.
+
+With STORAGE_LAYOUT = 'date' both are partitioned by upload day and id:
+
+    uploads/<process>/YYYY/MM/DD/<id>/<file name>
+    clean/<process>/APR_Clean/YYYY/MM/DD/<id>/<stem>__<id>.csv
+
+The 'flat' layout keeps uploads/<process>/<file name> and
+clean/<process>/APR_Clean/<stem>__<id>.csv. Either way the paths are read
+from the UploadedFile row; nothing lists a directory.
+"""
+import os
+import re
+from django.conf import settings
+from django.utils import timezone
+
+PARTITION_RE = re.compile(r'^\d{4}/\d{2}/\d{2}/\d+$')
+
+
+def uploads_dir(process_name):
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', process_name)
+
+
+def cleaned_dir(process_name):
+    return os.path.join(settings.MEDIA_ROOT, 'clean', process_name, 'APR_Clean')
+
+
+def upload_partition(uploaded_file):
+    """'YYYY/MM/DD/<id>' for a saved upload, by its local upload day."""
+    day = timezone.localdate(uploaded_file.uploaded_at)
+    return f"{day:%Y/%m/%d}/{uploaded_file.pk}"
+
+
+def source_partition(process_name, source_path):
+    """The date partition a raw upload is stored in, or None for a flat one."""
+    folder = os.path.dirname(os.path.join(settings.MEDIA_ROOT, source_path))
+    partition = os.path.relpath(folder, uploads_dir(process_name)).replace(os.sep, '/')
+    return partition if PARTITION_RE.match(partition) else None
+
+
+def cleaned_path(process_name, source_path, upload_id=None):
+    """
+    Cleaned CSV written by clean() for the raw file at `source_path`.
+    With an upload id the name is '<stem>__<id>.csv', unique per UploadedFile;
+    a partitioned upload gets the same partition under APR_Clean.
+    """
+    stem = os.path.basename(source_path).rsplit('.', 1)[0]
+    if upload_id is not None:
+        stem = f"{stem}__{upload_id}"
+    partition = source_partition(process_name, source_path)
+    if partition:
+        return os.path.join(cleaned_dir(process_name), *partition.split('/'), stem + '.csv')
+    return os.path.join(cleaned_dir(process_name), stem + '.csv')
+
+
+def cleaned_path_for(uploaded_file):
+    if uploaded_file.cleaned_file:
+        return os.path.join(settings.MEDIA_ROOT, uploaded_file.cleaned_file)
+    # Uploads cleaned before outputs were tied to the upload id
+    return cleaned_path(uploaded_file.process, uploaded_file.file.name)
+
+
+def prune_empty_dirs(path, root):
+    """Remove the now-empty folders between `path`'s folder and `root` (exclusive)."""
+    folder, root = os.path.dirname(os.path.abspath(path)), os.path.abspath(root)
+    while folder.startswith(root + os.sep):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            break
+        folder = os.path.dirname(folder)
+
+
+def reference_format_path(process_name):
+    return os.path.join(settings.MEDIA_ROOT, 'reference', process_name, 'format.xlsx')
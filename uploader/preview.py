@@ -0,0 +1,100 @@
+"""
+Paged reads of cleaned CSVs through a sidecar row index.
+
+`<file>.csv.idx` holds little-endian uint64 byte offsets: the start of every
+data row followed by the file size, so row i spans offsets[i]:offsets[i + 1]
+and the header is everything before offsets[0]. A page is read by looking up
+two offsets in the memory-mapped index and slicing the memory-mapped CSV, so
+the cost does not depend on the page number.
+"""
+import csv
+import io
+import mmap
+import os
+import struct
+import sys
+from array import array
+from .fsutil import write_atomic
+
+OFFSET = struct.Struct('<Q')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def index_path(csv_path):
+    return csv_path + '.idx'
+
+
+def build_row_index(csv_path):
+    """Write the row offset index for `csv_path` (quoted newlines stay inside their row)."""
+    offsets = array('Q')
+    position = 0
+    in_quotes = False
+    header_done = False
+    with open(csv_path, 'rb') as f:
+        for line in f:
+            if not in_quotes:
+                if header_done:
+                    offsets.append(position)
+                else:
+                    header_done = True
+            position += len(line)
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+    offsets.append(position)
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            offsets.tofile(f)
+    # Concurrent previews may rebuild the same stale index
+    write_atomic(index_path(csv_path), write)
+    return len(offsets) - 1
+
+
+def ensure_row_index(csv_path):
+    idx = index_path(csv_path)
+    if not os.path.exists(idx) or os.path.getmtime(idx) < os.path.getmtime(csv_path):
+        build_row_index(csv_path)
+    return idx
+
+
+def _parse(raw):
+    return list(csv.reader(io.StringIO(raw.decode('utf-8', errors='replace'), newline='')))
+
+
+def read_page(csv_path, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """Rows of 1-based `page` from a cleaned CSV, plus the header and paging totals."""
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    idx = ensure_row_index(csv_path)
+
+    with open(idx, 'rb') as fi, open(csv_path, 'rb') as fc:
+        index_map = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+        data = mmap.mmap(fc.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(fc.fileno()).st_size else b''
+        try:
+            total_rows = len(index_map) // OFFSET.size - 1
+            total_pages = max(1, -(-total_rows // page_size))
+            page = max(1, min(int(page), total_pages))
+
+            first = (page - 1) * page_size
+            last = min(first + page_size, total_rows)
+            header_end = OFFSET.unpack_from(index_map, 0)[0]
+            start = OFFSET.unpack_from(index_map, first * OFFSET.size)[0]
+            end = OFFSET.unpack_from(index_map, last * OFFSET.size)[0]
+
+            header = _parse(data[:header_end])
+            rows = _parse(data[start:end]) if last > first else []
+        finally:
+            index_map.close()
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    return {
+        'header': header[0] if header else [],
+        'rows': rows,
+        'page': page,
+        'page_size': page_size,
+        'total_rows': total_rows,
+        'total_pages': total_pages,
+    }
@@ -0,0 +1,191 @@
+"""
+Per-process read profiles (media/profiles/<process>.json).
+
+A profile records how a process's exports look so the loader can skip
+pandas' sniffing and type inference: delimiter, encoding, the observed dtype
+of every column, date/time columns, and columns that have been empty in
+every upload so far. Profiles are seeded from the reference format.xlsx and
+refined after each cleaned upload (or in bulk by `build_read_profiles`).
+
+Only text columns are forced (as str/category); numeric columns are left to
+the C parser so cleaned output keeps its number formatting. Columns empty in
+UNUSED_AFTER_UPLOADS uploads are reported as unused but still read: a column
+can fill up again at any upload, and clean() drops all-empty columns anyway.
+"""
+import codecs
+import csv
+import json
+import os
+from django.conf import settings
+from django.utils import timezone
+from .fsutil import write_atomic
+from .locks import file_lock
+from .paths import reference_format_path
+from .registry import get_process_mapping
+
+SNIFF_BYTES = 64 * 1024
+UNUSED_AFTER_UPLOADS = 5
+TEXT_DTYPES = ('str', 'category')
+
+
+def profile_path(process_name):
+    return os.path.join(settings.MEDIA_ROOT, 'profiles', f"{process_name}.json")
+
+
+def load_profile(process_name):
+    try:
+        with open(profile_path(process_name), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_profile(profile):
+    profile['updated_at'] = timezone.now().isoformat()
+
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=2)
+    write_atomic(profile_path(profile['process']), write)
+
+
+def seed_profile(process_name):
+    """New profile from the reference header and the column mapping."""
+    columns = []
+    reference = reference_format_path(process_name)
+    if os.path.exists(reference):
+        import openpyxl
+        workbook = openpyxl.load_workbook(reference, read_only=True)
+        try:
+            first_row = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+            columns = [str(c) for c in first_row if c is not None]
+        finally:
+            workbook.close()
+
+    try:
+        mapping = get_process_mapping(process_name) or {}
+    except FileNotFoundError:
+        mapping = {}
+    date_columns = [
+        c for c in columns
+        if c == mapping.get('first_login_col') or 'date' in c.lower() or 'time' in c.lower()
+    ]
+    return {
+        'process': process_name,
+        'delimiter': None,
+        'encoding': None,
+        'columns': columns,
+        'dtypes': {},
+        'date_columns': date_columns,
+        'empty_counts': {},
+        'unused_columns': [],
+        'uploads_seen': 0,
+    }
+
+
+def sniff_csv_format(file_path):
+    """(delimiter, encoding) of a CSV from its first bytes."""
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    if head.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
+        try:
+            head.decode('utf-8')
+            encoding = 'utf-8'
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut at the end of the sample is still utf-8
+            encoding = 'utf-8' if e.start >= len(head) - 3 else 'cp1252'
+    text = head.decode(encoding, errors='ignore')
+    try:
+        delimiter = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=',;\t|').delimiter
+    except csv.Error:
+        delimiter = ','
+    return delimiter, encoding
+
+
+def dtype_kind(series):
+    import pandas as pd
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return 'category'
+    if series.dtype == object:
+        return 'str'
+    if pd.api.types.is_bool_dtype(series):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(series):
+        return 'int64'
+    if pd.api.types.is_float_dtype(series):
+        return 'float64'
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'datetime'
+    return 'mixed'
+
+
+def merge_kind(old, new):
+    if old is None or old == new:
+        return new
+    if old in TEXT_DTYPES and new in TEXT_DTYPES:
+        return 'str'
+    if {old, new} == {'int64', 'float64'}:
+        return 'float64'
+    return 'mixed'
+
+
+def read_kwargs(profile, ext, protected=()):
+    """pandas read_csv/read_excel keyword arguments for an upload of this process."""
+    if not profile or ext != 'csv':
+        # Excel cells carry their own types; forcing str would change dates
+        return {}
+
+    # Keep the parser's chunked low_memory reads: the pinned text dtypes already
+    # rule out the mixed-type columns low_memory=False would guard against
+    kwargs = {'engine': 'c'}
+    if profile.get('delimiter'):
+        kwargs['sep'] = profile['delimiter']
+    if profile.get('encoding'):
+        kwargs['encoding'] = profile['encoding']
+    dtypes = {
+        col: ('str' if col in protected else kind)
+        for col, kind in profile.get('dtypes', {}).items()
+        if kind in TEXT_DTYPES
+    }
+    if dtypes:
+        kwargs['dtype'] = dtypes
+    return kwargs
+
+
+def observe_upload(profile, df, file_path):
+    """Fold one loaded upload (as read by clean()) into the profile."""
+    if file_path.lower().endswith('.csv') and (not profile.get('delimiter') or not profile.get('encoding')):
+        profile['delimiter'], profile['encoding'] = sniff_csv_format(file_path)
+
+    columns = [str(c) for c in df.columns]
+    known = profile.setdefault('columns', [])
+    known.extend(c for c in columns if c not in known)
+
+    dtypes = profile.setdefault('dtypes', {})
+    empty_counts = profile.setdefault('empty_counts', {})
+    for col in df.columns:
+        series = df[col]
+        name = str(col)
+        dtypes[name] = merge_kind(dtypes.get(name), dtype_kind(series))
+        if series.isna().all() or (series.dtype == object and (series.astype(str).str.strip() == '').all()):
+            empty_counts[name] = empty_counts.get(name, 0) + 1
+        else:
+            empty_counts[name] = 0
+
+    profile['uploads_seen'] = profile.get('uploads_seen', 0) + 1
+    profile['unused_columns'] = sorted(
+        c for c, n in empty_counts.items()
+        if n >= UNUSED_AFTER_UPLOADS and c not in profile.get('date_columns', ())
+    )
+    return profile
+
+
+def refine_profile(process_name, df, file_path):
+    """Load (or seed) the process profile, fold this upload into it and save it."""
+    with file_lock(f"profile-{process_name}"):
+        profile = load_profile(process_name) or seed_profile(process_name)
+        observe_upload(profile, df, file_path)
+        save_profile(profile)
+    return profile
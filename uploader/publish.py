@@ -0,0 +1,137 @@
+"""
+Steps that follow a successful clean(): record which dates an upload
+covered in UploadStatus and publish the cleaned CSV to the portal folder.
+
+Both are safe to run from many workers at once: status updates for a
+process/date are made under an advisory lock and never move a date back
+to an older upload, and portal files are written under a temporary name
+and renamed into place.
+"""
+import logging
+import os
+import shutil
+from django.conf import settings
+from django.utils import timezone
+from .db import serialized_write
+from .fsutil import write_atomic
+from .locks import multi_lock
+from .models import UploadStatus
+from .registry import get_process_mapping
+
+logger = logging.getLogger(__name__)
+
+
+def portal_dir(process_name):
+    safe_process = process_name.replace(" ", "_")
+    return os.path.join(settings.PORTAL_DATA_ROOT, safe_process, 'APR_Clean')
+
+
+def publish_to_portal(process_name, cleaned_file_path, upload_id=None):
+    """
+    Copy a cleaned CSV to the portal as '<portal name>%<file name>'. Returns the destination path.
+
+    For processes in MERGE_KEYS (given the upload id) only new or changed rows are
+    published there, and None is returned when nothing changed; see uploader.merge.
+    """
+    mapping = get_process_mapping(process_name)
+    if mapping is None:
+        raise LookupError(f"No mapping row found for process: {process_name}")
+
+    destination_dir = portal_dir(process_name)
+    os.makedirs(destination_dir, exist_ok=True)
+    pn = mapping['portal_name']   # 5th column
+    destination_path = os.path.join(destination_dir, f"{pn}%{os.path.basename(cleaned_file_path)}")
+
+    from .merge import merge_enabled
+    if upload_id is not None and merge_enabled(process_name):
+        from .merge import merge_upload
+        delta = merge_upload(process_name, pn, cleaned_file_path, upload_id)
+        if delta.empty:
+            return None
+        write_atomic(destination_path, lambda tmp: delta.to_csv(tmp, index=False))
+        return destination_path
+
+    write_atomic(destination_path, lambda tmp: shutil.copy2(cleaned_file_path, tmp))
+    return destination_path
+
+
+def cleaned_dates(cleaned_file_path):
+    """Distinct 'Raw Date' values of a cleaned CSV as (dates, invalid_values)."""
+    import pandas as pd
+
+    df = pd.read_csv(cleaned_file_path, usecols=lambda c: c == 'Raw Date', dtype=str)
+    if 'Raw Date' not in df.columns:
+        return [], []
+    dates, invalid = [], []
+    for date_str in df['Raw Date'].dropna().unique():
+        try:
+            dates.append(pd.to_datetime(date_str, format='%d-%m-%Y').date())
+        except Exception:
+            invalid.append(date_str)
+    return dates, invalid
+
+
+def status_lock_names(process_name, dates):
+    return [f"finalize/{process_name}/{d.isoformat()}" for d in sorted(set(dates))]
+
+
+def record_upload_dates(uploaded_file, process_name, dates):
+    """
+    Point UploadStatus for each (process, date) at `uploaded_file`, unless a
+    newer upload (higher id) already owns that date. Returns the dates updated.
+    """
+    def record_statuses():
+        existing = {
+            s.date: s for s in UploadStatus.objects.filter(process=process_name, date__in=dates)
+        }
+        updated = []
+        for d in dates:
+            status = existing.get(d)
+            if status is not None and status.uploaded_file_id and status.uploaded_file_id > uploaded_file.id:
+                continue
+            UploadStatus.objects.update_or_create(
+                process=process_name,
+                date=d,
+                defaults={'status': 'Uploaded', 'uploaded_file': uploaded_file},
+            )
+            updated.append(d)
+        return updated
+
+    if not dates:
+        return []
+    with multi_lock(status_lock_names(process_name, dates)):
+        return serialized_write(record_statuses)
+
+
+def record_dates_bulk(process_name, dates_by_upload):
+    """
+    record_upload_dates for many uploads of one process in a single write:
+    `dates_by_upload` maps UploadedFile id -> dates, and each date goes to the
+    newest upload covering it. Returns the number of statuses written.
+    """
+    owners = {}
+    for upload_id, dates in dates_by_upload.items():
+        for d in dates:
+            owners[d] = max(owners.get(d, 0), upload_id)
+
+    def record_statuses():
+        existing = {
+            s.date: s for s in UploadStatus.objects.filter(process=process_name, date__range=(min(owners), max(owners)))
+        }
+        created, changed = [], []
+        now = timezone.now()
+        for d, upload_id in owners.items():
+            status = existing.get(d)
+            if status is None:
+                created.append(UploadStatus(process=process_name, date=d, status='Uploaded', uploaded_file_id=upload_id))
+            elif not status.uploaded_file_id or status.uploaded_file_id <= upload_id:
+                status.status, status.uploaded_file_id, status.updated_at = 'Uploaded', upload_id, now
+                changed.append(status)
+        UploadStatus.objects.bulk_create(created, batch_size=500)
+        UploadStatus.objects.bulk_update(changed, ['status', 'uploaded_file', 'updated_at'], batch_size=500)
+        return len(created) + len(changed)
+
+    if not owners:
+        return 0
+    with multi_lock(status_lock_names(process_name, owners)):
+        return serialized_write(record_statuses)
@@ -0,0 +1,70 @@
+"""
+Process registry: the process list (media/process/process.csv) and the column
+mapping (media/Map/map.csv), read with the csv module and cached per worker
+until the file changes on disk. Kept free of pandas so the login and upload
+pages can use it without paying for the heavy imports.
+"""
+import csv
+import os
+import threading
+from django.conf import settings
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _read_rows(path):
+    """Rows of a small CSV file, re-read only when its mtime changes. None if missing."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = [row for row in csv.reader(f) if row]
+    with _lock:
+        _cache[path] = (mtime, rows)
+    return rows
+
+
+def process_csv_path():
+    return os.path.join(settings.MEDIA_ROOT, 'process', 'process.csv')
+
+
+def map_csv_path():
+    return os.path.join(settings.MEDIA_ROOT, 'Map', 'map.csv')
+
+
+def get_process_options():
+    """Process names offered in the upload form, in file order."""
+    return [row[0] for row in _read_rows(process_csv_path()) or []]
+
+
+def get_process_mapping(process_name):
+    """
+    Column mapping for a process (matched case-insensitively), or None when
+    the process has no row. Raises FileNotFoundError if map.csv is missing.
+    """
+    rows = _read_rows(map_csv_path())
+    if rows is None:
+        raise FileNotFoundError(map_csv_path())
+    key = str(process_name).strip().lower()
+    for row in rows:
+        if row[0].strip().lower() == key:
+            row = row + [''] * (5 - len(row))
+            return {
+                'login_col': row[1],
+                'break_col': row[2],
+                'first_login_col': row[3],
+                'portal_name': row[4].strip(),
+            }
+    return None
+
+
+def warm():
+    """Load both registry files into the cache (used when preloading before fork)."""
+    _read_rows(process_csv_path())
+    _read_rows(map_csv_path())
@@ -0,0 +1,120 @@
+"""
+Worksheet selection and parallel parsing for multi-sheet XLSX uploads.
+
+A process can name its sheets with a regex in SHEET_NAME_PATTERNS; otherwise
+every sheet whose header row matches the reference format is used. Selected
+sheets are parsed in separate processes (openpyxl parsing is pure Python, so
+threads would not overlap) and returned as one frame.
+
+SHEET_PARSE_WORKERS caps those processes for the whole server, not per
+request: each one holds a parse slot (a file lock), and an upload that finds
+no slots free parses its sheets in the request thread as a single-sheet
+upload would.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from multiprocessing import get_context
+from django.conf import settings
+from .locks import LockTimeout, file_lock
+from .paths import reference_format_path
+
+
+def header_signature(row):
+    """Normalized header cells, without the empty cells at the end of the row."""
+    cells = ['' if c is None else str(c).strip().lower() for c in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    return cells
+
+
+def sheet_headers(workbook_file):
+    """[(sheet name, header signature)] for every worksheet, in workbook order."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(workbook_file, read_only=True, data_only=True)
+    try:
+        return [
+            (ws.title, header_signature(next(ws.iter_rows(max_row=1, values_only=True), ())))
+            for ws in workbook.worksheets
+        ]
+    finally:
+        workbook.close()
+        if hasattr(workbook_file, 'seek'):
+            workbook_file.seek(0)
+
+
+def reference_signature(process_name):
+    return sheet_headers(reference_format_path(process_name))[0][1]
+
+
+def select_sheets(workbook_file, process_name):
+    """
+    (selected, mismatched) sheet names. Selected are the sheets matching the
+    process's name pattern, or else whose header matches the reference format;
+    mismatched are selected-by-name sheets whose header does not.
+    """
+    headers = sheet_headers(workbook_file)
+    signature = reference_signature(process_name)
+    pattern = getattr(settings, 'SHEET_NAME_PATTERNS', {}).get(process_name)
+    if pattern:
+        selected = [(name, header) for name, header in headers if re.search(pattern, name)]
+        return [name for name, _ in selected], [name for name, header in selected if header != signature]
+    return [name for name, header in headers if header == signature], []
+
+
+def read_sheet_group(file_path, sheet_names, options):
+    """Read several sheets with one workbook open (shared strings are parsed once per open)."""
+    import pandas as pd
+    return pd.read_excel(file_path, engine='openpyxl', sheet_name=list(sheet_names), **options)
+
+
+@contextmanager
+def parse_slots(wanted):
+    """Take up to `wanted` free parse slots, without waiting; yields how many were taken."""
+    with ExitStack() as stack:
+        taken = 0
+        for slot in range(getattr(settings, 'SHEET_PARSE_WORKERS', os.cpu_count() or 1)):
+            if taken == wanted:
+                break
+            try:
+                stack.enter_context(file_lock(f"sheet-parse/{slot}", timeout=0))
+                taken += 1
+            except LockTimeout:
+                continue
+        yield taken
+
+
+def read_sheets(file_path, sheet_names, options):
+    """
+    Read `sheet_names` concurrently and stack them in order. Columns follow the
+    first sheet (headers match case-insensitively). Returns (frame, rows per sheet).
+    """
+    import pandas as pd
+
+    with ExitStack() as stack:
+        workers = min(len(sheet_names), os.cpu_count() or 1)
+        if workers > 1:
+            workers = stack.enter_context(parse_slots(workers))
+        if workers > 1:
+            # Contiguous groups, one workbook open per worker
+            size = -(-len(sheet_names) // workers)
+            groups = [sheet_names[i:i + size] for i in range(0, len(sheet_names), size)]
+            # forkserver: children never inherit the request threads or their locks
+            context = get_context('forkserver')
+            context.set_forkserver_preload(['pandas', 'openpyxl', 'uploader.sheets'])
+            with ProcessPoolExecutor(max_workers=len(groups), mp_context=context) as pool:
+                parsed = {}
+                for frames in pool.map(read_sheet_group, [file_path] * len(groups), groups, [options] * len(groups)):
+                    parsed.update(frames)
+        else:
+            parsed = read_sheet_group(file_path, sheet_names, options)
+
+    frames = [parsed[name] for name in sheet_names]
+    columns = frames[0].columns
+    for frame in frames[1:]:
+        if len(frame.columns) == len(columns):
+            frame.columns = columns
+    counts = {name: len(frame) for name, frame in zip(sheet_names, frames)}
+    return pd.concat(frames, ignore_index=True), counts
@@ -0,0 +1,24 @@
+"""
+Worker start-up helpers.
+
+Views import the cleaning code (pandas, numpy, openpyxl) lazily, so a fresh
+worker can serve the login page without it. In preload mode gunicorn calls
+`preload()` once in the master so forked workers inherit the imports and
+registries already warm.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def preload():
+    import pandas  # noqa: F401
+    import numpy  # noqa: F401
+    import openpyxl  # noqa: F401
+    from django.db import connections
+    from . import registry, utils  # noqa: F401
+
+    registry.warm()
+    # Never hand an open SQLite connection across fork
+    connections.close_all()
+    logger.info("Preloaded cleaning dependencies and registries")
@@ -1,3 +1,829 @@
-from django.test import TestCase
+import copy
+import io
+import json
+import logging
+import logging.config
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.utils import timezone
+from .db import serialized_write
+from .models import AgentDailyMinutes, ArchivedFile, FailureNotification, UploadedFile, UploadStatus
+from .paths import cleaned_path_for
+from .utils import clean_fingerprint
 
-# Create your tests here.
+JIO_HEADER = (
+    "S_No,Date,Interval,Call_Number,Service,Agent,Login_Id,Start_Time,End_Time,Extension,Dni,Cli,"
+    "Desposition,Lead_Id,Batch,Dialer_Type,Duration,Ivr_Duration,Ring_Duration,Talk_Duration,"
+    "Wrapup_Duration,Hold_Duration,Call_Status,Hangup_By,Child_CallNumbr,Ivr_Terminal"
+)
+
+
+def jio_csv(day, rows=50, dni=''):
+    lines = [JIO_HEADER]
+    for i in range(rows):
+        lines.append(
+            f"{i + 1},{day:02d}-09-2025,09:00,90000{i:05d},JIO_OB,Agent {i % 7},L{i % 7},09:00:00,09:05:00,"
+            f"{100 + i},{dni},98000,Connected,{5000 + i},B1,Progressive,{i * 3},3,5,{i * 2},10,,ANSWERED,Agent,,"
+        )
+    return ("\n".join(lines) + "\n").encode()
+
+
+def configure_log_dir(log_dir):
+    """Point the LOGGING file handler at `log_dir`; Django applies LOGGING only once, at startup."""
+    config = copy.deepcopy(settings.LOGGING)
+    config['handlers']['file']['filename'] = os.path.join(log_dir, 'cleaning_errors.log')
+    logging.config.dictConfig(config)
+
+
+class UploadTestCase(TransactionTestCase):
+    """
+    Temp MEDIA_ROOT (with the JIO mapping and reference format), portal and log
+    folders, plus a logged-in 'uploader' user. Subclasses add settings in extra_settings.
+    """
+    extra_settings = {}
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.portal = tempfile.mkdtemp()
+        self.logs = tempfile.mkdtemp()
+        for folder in ('Map', 'process', os.path.join('reference', 'JIO')):
+            shutil.copytree(os.path.join(settings.MEDIA_ROOT, folder), os.path.join(self.media, folder))
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media, PORTAL_DATA_ROOT=self.portal, LOG_DIR=self.logs, **self.extra_settings
+        )
+        self.settings_override.enable()
+        configure_log_dir(self.logs)
+        User.objects.create_user('uploader', password='secret')
+        self.client.login(username='uploader', password='secret')
+
+    def tearDown(self):
+        # Closes the temp log file before it is removed
+        logging.config.dictConfig(settings.LOGGING)
+        self.settings_override.disable()
+        for folder in (self.media, self.portal, self.logs):
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+class ConcurrentUploadTests(UploadTestCase):
+    """Parallel uploads hitting SQLite from several threads must not fail with "database is locked"."""
+
+    workers = 8
+
+    def run_in_threads(self, target):
+        errors = []
+
+        def wrapper(i):
+            try:
+                target(i)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=wrapper, args=(i,)) for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return errors
+
+    def test_parallel_uploads_complete(self):
+        responses = {}
+
+        def upload(i):
+            client = Client()
+            client.login(username='uploader', password='secret')
+            upload_file = SimpleUploadedFile(f"jio_{i}.csv", jio_csv(day=i + 1), content_type='text/csv')
+            responses[i] = client.post('/upload/', {'process': 'JIO', 'file': upload_file})
+
+        errors = self.run_in_threads(upload)
+
+        self.assertEqual(errors, [])
+        for i, response in responses.items():
+            self.assertContains(response, "File uploaded and cleaned successfully!", msg_prefix=f"upload {i}")
+        self.assertEqual(UploadedFile.objects.count(), self.workers)
+        self.assertEqual(UploadStatus.objects.filter(process='JIO', status='Uploaded').count(), self.workers)
+
+    def test_same_name_uploads_keep_separate_outputs(self):
+        def upload(i):
+            client = Client()
+            client.login(username='uploader', password='secret')
+            upload_file = SimpleUploadedFile("daily.csv", jio_csv(day=1, rows=50 + i), content_type='text/csv')
+            client.post('/upload/', {'process': 'JIO', 'file': upload_file})
+
+        self.assertEqual(self.run_in_threads(upload), [])
+
+        uploads = list(UploadedFile.objects.order_by('id'))
+        cleaned = [cleaned_path_for(u) for u in uploads]
+        self.assertEqual(len(set(cleaned)), self.workers)
+        for u, path in zip(uploads, cleaned):
+            self.assertTrue(path.endswith(f"__{u.id}.csv"))
+            with u.file.open('rb') as raw:
+                raw_lines = raw.read().count(b"\n")
+            with open(path) as f:
+                # header + the rows of that upload only
+                self.assertEqual(sum(1 for _ in f), raw_lines)
+        status = UploadStatus.objects.get(process='JIO', date='2025-09-01')
+        self.assertEqual(status.uploaded_file_id, uploads[-1].id)
+        self.assertEqual(len(os.listdir(os.path.join(self.portal, 'JIO', 'APR_Clean'))), self.workers)
+
+    def test_serialized_writes_to_same_rows(self):
+        def write(i):
+            for _ in range(20):
+                serialized_write(
+                    UploadStatus.objects.update_or_create,
+                    process='JIO', date=f"2025-09-{i % 3 + 1:02d}", defaults={'status': 'Uploaded'},
+                )
+
+        self.assertEqual(self.run_in_threads(write), [])
+        self.assertEqual(UploadStatus.objects.count(), 3)
+
+    def test_parallel_row_index_rebuilds(self):
+        from .preview import build_row_index, read_page
+
+        path = os.path.join(self.media, 'rows.csv')
+        with open(path, 'wb') as f:
+            f.write(jio_csv(day=1, rows=2000))
+
+        self.assertEqual(self.run_in_threads(lambda i: build_row_index(path)), [])
+        self.assertEqual(read_page(path, 1, 10)['total_rows'], 2000)
+        self.assertEqual(os.listdir(self.media).count('rows.csv.idx'), 1)
+        self.assertFalse([name for name in os.listdir(self.media) if name.endswith('.tmp')])
+
+    def test_failed_atomic_write_keeps_old_file(self):
+        from .fsutil import write_atomic
+
+        path = os.path.join(self.media, 'out', 'rows.csv')
+        write_atomic(path, lambda tmp: open(tmp, 'wb').close())
+
+        def fail(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(b'half')
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            write_atomic(path, fail)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['rows.csv'])
+        self.assertEqual(os.path.getsize(path), 0)
+
+    @override_settings(DB_LOCK_WAIT_LOG_MS=50)
+    def test_write_lock_wait_is_logged(self):
+        from .locks import file_lock
+
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with file_lock('db-write'):
+                held.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        held.wait(5)
+        threading.Timer(0.2, release.set).start()
+        with self.assertLogs('uploader.db', 'INFO') as logs:
+            serialized_write(UploadStatus.objects.count)
+        holder.join()
+        self.assertGreaterEqual(logs.records[0].lock_wait_ms, 150)
+
+
+class LoggingTests(UploadTestCase):
+    """Records are written as JSON lines with the upload context, and chatty levels are capped."""
+
+    def read_log(self):
+        # Stopping the listener writes out everything still queued
+        for handler in logging.getLogger().handlers:
+            handler.close()
+        with open(os.path.join(self.logs, 'cleaning_errors.log'), encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_upload_records_carry_process_and_upload_id(self):
+        from .log import log_context
+
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile('day.csv', jio_csv(day=1))})
+        upload = UploadedFile.objects.get()
+        try:
+            raise ValueError("bad row")
+        except ValueError:
+            with log_context(process='JIO', upload_id=upload.id):
+                logging.getLogger('uploader.tests').error("Could not read row", exc_info=True)
+
+        records = self.read_log()
+        cleaned = next(r for r in records if r['message'].startswith('Clean successful'))
+        self.assertEqual((cleaned['level'], cleaned['process'], cleaned['upload_id']), ('INFO', 'JIO', upload.id))
+        self.assertEqual(cleaned['pid'], os.getpid())
+        error = records[-1]
+        self.assertEqual((error['logger'], error['message'], error['upload_id']), ('uploader.tests', 'Could not read row', upload.id))
+        self.assertIn('ValueError: bad row', error['exc'])
+
+    def test_rate_limit_per_level_and_window(self):
+        from .log import LevelRateLimitFilter
+
+        limiter = LevelRateLimitFilter({'INFO': 2, 'debug': 0}, period=60)
+
+        def allowed(level):
+            return limiter.filter(logging.makeLogRecord({'levelno': level, 'levelname': logging.getLevelName(level)}))
+
+        with mock.patch('uploader.log.time.monotonic', return_value=600.0):
+            self.assertEqual([allowed(logging.INFO) for _ in range(3)], [True, True, False])
+            self.assertFalse(allowed(logging.DEBUG))
+            self.assertTrue(all(allowed(logging.ERROR) for _ in range(10)))
+        with mock.patch('uploader.log.time.monotonic', return_value=660.0):
+            self.assertTrue(allowed(logging.INFO))
+
+
+class MinutesAggregateTests(UploadTestCase):
+    """Per-agent minutes for a date come from the upload that owns the date."""
+
+    def test_newest_upload_replaces_a_dates_minutes(self):
+        import pandas as pd
+        from .utils import save_minutes_aggregate
+
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile("full.csv", jio_csv(day=1))})
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile("fixed.csv", jio_csv(day=1, rows=3))})
+        full, fixed = UploadedFile.objects.order_by('id')
+
+        def minutes():
+            return sorted(AgentDailyMinutes.objects.values_list('agent', 'row_count', 'uploaded_file_id'))
+
+        # Agents 3-6 are gone from the corrected upload
+        expected = [(f"Agent {i}", 1, fixed.id) for i in range(3)]
+        self.assertEqual(minutes(), expected)
+
+        # The older upload cleaned again (e.g. late) doesn't take the date back
+        late = pd.DataFrame({'Agent': ['Agent 0'] * 5, 'Raw Date': ['01-09-2025'] * 5, 'Minutes': [5] * 5})
+        self.assertEqual(save_minutes_aggregate('JIO', late, full.id), 0)
+        self.assertEqual(minutes(), expected)
+
+
+class NotifyingEmailBackend(locmem.EmailBackend):
+    """Queues another failure while the digest is being sent, like a concurrent upload would."""
+
+    def send_messages(self, messages):
+        from .utils import notify_failure
+        notify_failure('JIO', 'Mapping file not found', 'late.csv')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class MemoryBudgetTests(UploadTestCase):
+    """Uploads are loaded with compact dtypes and turned away when over the per-upload budget."""
+
+    def test_only_the_csv_header_is_read_to_validate(self):
+        from .utils import validate_file
+
+        # Rows pandas can't parse: reading past the header would fail
+        body = jio_csv(day=1, rows=5) + b'1,2\n' + b'a,' * 40 + b'\n'
+        self.assertEqual(validate_file(SimpleUploadedFile('big.csv', body), 'JIO'), (True, "File is valid"))
+
+    def test_over_budget_upload_fails_cleanly(self):
+        with mock.patch('uploader.utils.CLEAN_MEMORY_BUDGET_MB', 1):
+            response = self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile('big.csv', jio_csv(day=1, rows=30000))})
+
+        self.assertContains(response, "Upload succeeded but cleaning failed: File needs an estimated")
+        self.assertContains(response, "over the 1 MB per-upload limit")
+        self.assertEqual(FailureNotification.objects.get().reason, "Upload over memory budget")
+        self.assertFalse(UploadedFile.objects.get().cleaned_file)
+
+    def test_compact_dtypes_keep_cleaned_csv_identical(self):
+        from .utils import clean
+
+        source = os.path.join(self.media, 'day.csv')
+        with open(source, 'wb') as f:
+            f.write(jio_csv(day=1, rows=3000).replace(b',3,5,', b',3.0,5.5,'))
+        ok, _, output = clean(source, 'JIO', learn=False)
+        self.assertTrue(ok)
+        with open(output, 'rb') as f:
+            compact = f.read()
+
+        with mock.patch('uploader.utils.compact_frame', lambda df, protected=(): df), \
+                mock.patch('uploader.utils.plan_dtypes', lambda sample, protected=(): {}):
+            ok, _, output = clean(source, 'JIO', learn=False)
+        self.assertTrue(ok)
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), compact)
+
+
+class FailureNotificationTests(TransactionTestCase):
+    """Failures are folded per (process, reason) and mailed as one digest per process."""
+
+    def test_repeats_are_folded_into_one_digest(self):
+        from .utils import notify_failure
+
+        for name in ('a.csv', 'b.csv'):
+            notify_failure('JIO', 'Mapping file not found', name)
+        notify_failure('JIO', 'One or more required columns not found', 'c.csv')
+        notify_failure('HDFC', 'Mapping file not found', 'd.csv')
+        self.assertEqual(FailureNotification.objects.count(), 3)
+        self.assertEqual(FailureNotification.objects.get(process='JIO', reason='Mapping file not found').occurrences, 2)
+
+        call_command('send_failure_notifications', stdout=io.StringIO())
+
+        self.assertEqual(sorted(m.subject for m in mail.outbox), [
+            "Cleaning Failed - HDFC (1 failure)", "Cleaning Failed - JIO (3 failures)",
+        ])
+        jio = next(m for m in mail.outbox if 'JIO' in m.subject)
+        self.assertIn("Mapping file not found (x2)\n    a.csv\n    b.csv", jio.body)
+        self.assertFalse(FailureNotification.objects.filter(sent_at=None).exists())
+
+    @override_settings(EMAIL_BACKEND='uploader.tests.NotifyingEmailBackend')
+    def test_failure_queued_while_sending_is_kept(self):
+        from .utils import notify_failure
+
+        notify_failure('JIO', 'Mapping file not found', 'a.csv')
+        call_command('send_failure_notifications', stdout=io.StringIO())
+
+        pending = FailureNotification.objects.get(sent_at=None)
+        self.assertEqual((pending.files, pending.occurrences), ('late.csv', 1))
+        call_command('send_failure_notifications', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn("late.csv", mail.outbox[1].body)
+
+
+class ReadProfileTests(UploadTestCase):
+    """Read profiles speed up parsing without changing what gets cleaned."""
+
+    def test_column_that_fills_again_is_kept(self):
+        import pandas as pd
+
+        for day in range(1, 7):
+            self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile(f"d{day}.csv", jio_csv(day=day))})
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile("d7.csv", jio_csv(day=7, dni='DNI123'))})
+
+        cleaned = pd.read_csv(cleaned_path_for(UploadedFile.objects.latest('id')), dtype=str)
+        self.assertEqual(set(cleaned['Dni']), {'DNI123'})
+
+    def test_profile_reads_in_chunks_with_text_dtypes(self):
+        from .profiles import load_profile, read_kwargs
+
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile("d1.csv", jio_csv(day=1))})
+        kwargs = read_kwargs(load_profile('JIO'), 'csv')
+        self.assertEqual(kwargs['engine'], 'c')
+        self.assertNotIn('low_memory', kwargs)
+        self.assertEqual(kwargs['dtype']['Agent'], 'category')
+
+
+class RetentionTests(UploadTestCase):
+    """apply_retention archives old files by month and still serves them by upload id."""
+
+    extra_settings = {'RETENTION_POLICIES': {'default': {'compress_after_days': 30, 'purge_after_days': 365}}}
+
+    def upload(self, name, days_ago):
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile(name, jio_csv(day=1))})
+        uf = UploadedFile.objects.latest('id')
+        UploadedFile.objects.filter(pk=uf.pk).update(uploaded_at=timezone.now() - timedelta(days=days_ago))
+        return UploadedFile.objects.get(pk=uf.pk)
+
+    def test_archive_and_purge(self):
+        recent = self.upload('recent.csv', days_ago=1)
+        old = self.upload('old.csv', days_ago=60)
+        ancient = self.upload('ancient.csv', days_ago=800)
+        with old.file.open('rb') as f:
+            old_raw = f.read()
+
+        call_command('apply_retention', workers=2, stdout=io.StringIO())
+
+        self.assertTrue(os.path.isfile(recent.file.path))
+        self.assertFalse(os.path.exists(old.file.path))
+        self.assertFalse(os.path.exists(cleaned_path_for(old)))
+        self.assertFalse(os.path.exists(ancient.file.path))
+        self.assertEqual(ArchivedFile.objects.filter(uploaded_file=old, purged_at=None).count(), 2)
+        self.assertEqual(ArchivedFile.objects.filter(uploaded_file=ancient).exclude(purged_at=None).count(), 2)
+
+        response = self.client.get(f'/files/{old.id}/download/')
+        self.assertEqual(b''.join(response.streaming_content), old_raw)
+        response = self.client.get(f'/files/{old.id}/download/clean/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f'/files/{ancient.id}/download/').status_code, 404)
+
+        # Nothing left to do on a second run
+        out = io.StringIO()
+        call_command('apply_retention', stdout=out)
+        self.assertIn("Archived 0 file(s), deleted 0", out.getvalue())
+
+    def test_second_batch_is_appended_to_month_archive(self):
+        import zipfile
+        from .archive import archive_files, archive_path
+
+        sources = []
+        for day in (1, 2):
+            source = os.path.join(self.media, f'day{day}.csv')
+            with open(source, 'wb') as f:
+                f.write(jio_csv(day=day))
+            sources.append(source)
+        archive_files('JIO', '2025-01', [(sources[0], 'raw/1/day1.csv'), (sources[0], 'clean/1/day1.csv')])
+        path = archive_path('JIO', '2025-01')
+        with zipfile.ZipFile(path) as zf:
+            first_members = [(i.filename, i.header_offset, i.compress_size, i.CRC) for i in zf.infolist()]
+            first_data_end = zf.start_dir
+        with open(path, 'rb') as f:
+            first_data = f.read(first_data_end)
+
+        opened = []
+        real_open = zipfile.ZipFile.open
+
+        def spy_open(zf, name, mode='r', *args, **kwargs):
+            opened.append((getattr(name, 'filename', name), mode))
+            return real_open(zf, name, mode, *args, **kwargs)
+
+        with mock.patch.object(zipfile.ZipFile, 'open', spy_open):
+            archive_files('JIO', '2025-01', [(sources[1], 'raw/2/day2.csv')])
+        self.assertEqual(opened, [('raw/2/day2.csv', 'w')])
+
+        with zipfile.ZipFile(path) as zf:
+            self.assertEqual(zf.namelist(), ['raw/1/day1.csv', 'clean/1/day1.csv', 'raw/2/day2.csv'])
+            self.assertEqual(zf.read('raw/1/day1.csv'), jio_csv(day=1))
+            self.assertEqual(zf.read('raw/2/day2.csv'), jio_csv(day=2))
+            self.assertEqual([(i.filename, i.header_offset, i.compress_size, i.CRC) for i in zf.infolist()[:2]], first_members)
+        # The first batch's bytes were copied, not recompressed
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(first_data_end), first_data)
+
+    def test_failed_append_keeps_month_archive(self):
+        import zipfile
+        from .archive import archive_files, archive_path
+
+        first = os.path.join(self.media, 'first.csv')
+        with open(first, 'wb') as f:
+            f.write(jio_csv(day=1))
+        archive_files('JIO', '2025-01', [(first, 'raw/1/first.csv')])
+
+        # Dies part-way through adding to the month, like a killed run
+        with self.assertRaises(FileNotFoundError):
+            archive_files('JIO', '2025-01', [(first, 'raw/2/again.csv'), (first + '.gone', 'raw/3/gone.csv')])
+
+        with zipfile.ZipFile(archive_path('JIO', '2025-01')) as zf:
+            self.assertEqual(zf.namelist(), ['raw/1/first.csv'])
+            self.assertEqual(zf.read('raw/1/first.csv'), jio_csv(day=1))
+        self.assertEqual(os.listdir(os.path.dirname(archive_path('JIO', '2025-01'))), ['2025-01.zip'])
+
+
+class RecleanTests(UploadTestCase):
+    """reclean regenerates only outputs whose fingerprint is stale."""
+
+    def test_reclean_skips_current(self):
+        for day in (1, 2):
+            self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile(f"d{day}.csv", jio_csv(day=day))})
+        first, second = UploadedFile.objects.order_by('id')
+        self.assertTrue(first.clean_fingerprint.startswith('v'))
+        os.remove(cleaned_path_for(first))
+        UploadedFile.objects.filter(pk=first.pk).update(clean_fingerprint='v0:stale')
+        UploadStatus.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('reclean', process=['JIO'], workers=2, stdout=out)
+
+        self.assertIn("Re-cleaned 1, 1 already current, 0 failed", out.getvalue())
+        first.refresh_from_db()
+        self.assertEqual(first.clean_fingerprint, clean_fingerprint(first.file.path))
+        self.assertTrue(os.path.isfile(cleaned_path_for(first)))
+        self.assertEqual(UploadStatus.objects.get(process='JIO', date='2025-09-01').uploaded_file_id, first.id)
+
+    def test_worker_error_still_saves_other_uploads(self):
+        from . import utils
+
+        for day in (1, 2):
+            self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile(f"d{day}.csv", jio_csv(day=day))})
+        broken, good = UploadedFile.objects.order_by('id')
+        UploadedFile.objects.update(clean_fingerprint='v0:stale')
+        real_fingerprint = utils.clean_fingerprint
+
+        def fingerprint(path):
+            if path == broken.file.path:
+                raise OSError("read error")
+            return real_fingerprint(path)
+
+        out = io.StringIO()
+        # Pool workers are forked, so they see the patched function
+        with mock.patch.object(utils, 'clean_fingerprint', fingerprint), \
+                self.assertRaisesMessage(CommandError, "1 upload(s) could not be re-cleaned"):
+            call_command('reclean', process=['JIO'], workers=2, stdout=out)
+
+        self.assertIn(f"#{broken.id} {broken.file.name}: OSError: read error", out.getvalue())
+        self.assertIn("Re-cleaned 1, 0 already current, 1 failed", out.getvalue())
+        broken.refresh_from_db()
+        good.refresh_from_db()
+        self.assertEqual(broken.clean_fingerprint, 'v0:stale')
+        self.assertEqual(good.clean_fingerprint, clean_fingerprint(good.file.path))
+
+    def test_reclean_of_older_upload_keeps_newer_minutes(self):
+        from .profiles import load_profile
+
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile("full.csv", jio_csv(day=1))})
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile("fixed.csv", jio_csv(day=1, rows=3))})
+        full, fixed = UploadedFile.objects.order_by('id')
+        seen = load_profile('JIO')['uploads_seen']
+
+        call_command('reclean', process=['JIO'], force=True, workers=1, stdout=io.StringIO())
+
+        self.assertEqual(UploadStatus.objects.get(process='JIO', date='2025-09-01').uploaded_file_id, fixed.id)
+        self.assertEqual(
+            sorted(AgentDailyMinutes.objects.values_list('agent', 'row_count', 'uploaded_file_id')),
+            [(f"Agent {i}", 1, fixed.id) for i in range(3)],
+        )
+        self.assertEqual(load_profile('JIO')['uploads_seen'], seen)
+
+
+class DownloadAccessTests(UploadTestCase):
+    """Uploads are served to their owner and staff only, with Range and conditional requests."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile('day.csv', jio_csv(day=1))})
+        self.upload = UploadedFile.objects.get()
+        with self.upload.file.open('rb') as f:
+            self.raw = f.read()
+
+    def login(self, username, is_staff=False):
+        User.objects.create_user(username, password='secret', is_staff=is_staff)
+        client = Client()
+        client.login(username=username, password='secret')
+        return client
+
+    def test_other_users_get_not_found(self):
+        other = self.login('other')
+        for url in (f'/files/{self.upload.id}/download/', f'/files/{self.upload.id}/download/clean/',
+                    f'/files/{self.upload.id}/preview/', f'/api/files/{self.upload.id}/rows/'):
+            self.assertEqual(other.get(url).status_code, 404, url)
+
+        staff = self.login('staff', is_staff=True)
+        response = staff.get(f'/files/{self.upload.id}/download/')
+        self.assertEqual(b''.join(response.streaming_content), self.raw)
+        self.assertContains(staff.get(f'/files/{self.upload.id}/preview/'), 'Agent 0')
+
+    def test_range_requests(self):
+        url = f'/files/{self.upload.id}/download/'
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.raw)}')
+        self.assertEqual(b''.join(response.streaming_content), self.raw[10:20])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response['Content-Range'], f'bytes {len(self.raw) - 5}-{len(self.raw) - 1}/{len(self.raw)}')
+        self.assertEqual(b''.join(response.streaming_content), self.raw[-5:])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.raw)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.raw)}')
+
+    def test_conditional_requests(self):
+        url = f'/files/{self.upload.id}/download/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        first.close()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        # A stale validator gets the file again
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+
+class IncrementalMergeTests(UploadTestCase):
+    """With MERGE_KEYS a re-upload publishes only new or changed rows."""
+
+    extra_settings = {'MERGE_KEYS': {'JIO': None}}
+
+    def published_rows(self, folder):
+        path = os.path.join(self.portal, 'JIO', folder)
+        counts = {}
+        for name in os.listdir(path):
+            with open(os.path.join(path, name)) as f:
+                counts[name] = sum(1 for _ in f) - 1
+        return counts
+
+    def test_reupload_publishes_delta(self):
+        for name, rows in (('first.csv', 50), ('extended.csv', 55), ('same.csv', 55)):
+            self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile(name, jio_csv(day=1, rows=rows))})
+
+        first, extended, same = UploadedFile.objects.order_by('id')
+        delta = self.published_rows('APR_Clean')
+        self.assertEqual(sorted(delta.values()), [5, 50])
+        self.assertTrue(any(name.endswith(f"__{extended.id}.csv") and rows == 5 for name, rows in delta.items()))
+        self.assertEqual(list(self.published_rows('APR_Consolidated').values()), [55])
+        self.assertEqual(UploadStatus.objects.get(process='JIO', date='2025-09-01').uploaded_file_id, same.id)
+
+
+class MultiSheetTests(UploadTestCase):
+    """Workbooks with a sheet per day are cleaned into one output."""
+
+    def test_sheets_matching_reference_are_combined(self):
+        import pandas as pd
+
+        workbook = io.BytesIO()
+        with pd.ExcelWriter(workbook) as writer:
+            pd.DataFrame({'Report': ['x']}).to_excel(writer, sheet_name='Summary', index=False)
+            for day in (1, 2, 3):
+                sheet = pd.read_csv(io.BytesIO(jio_csv(day=day, rows=10 * day)))
+                # Footer rows end each sheet, not the whole workbook
+                sheet.loc[len(sheet), 'Agent'] = 'Total'
+                sheet.to_excel(writer, sheet_name=f"Day {day}", index=False)
+
+        upload = SimpleUploadedFile('month.xlsx', workbook.getvalue())
+        response = self.client.post('/upload/', {'process': 'JIO', 'file': upload})
+
+        self.assertContains(response, "Cleaned 60 rows from 3 sheets (Day 1: 10, Day 2: 20, Day 3: 30)")
+        self.assertEqual(UploadStatus.objects.filter(process='JIO').count(), 3)
+
+    @override_settings(SHEET_PARSE_WORKERS=2)
+    def test_parse_processes_are_capped_across_requests(self):
+        import pandas as pd
+        from . import sheets
+        from .locks import file_lock
+
+        path = os.path.join(self.media, 'month.xlsx')
+        with pd.ExcelWriter(path) as writer:
+            for day in (1, 2, 3):
+                pd.read_csv(io.BytesIO(jio_csv(day=day, rows=day))).to_excel(writer, sheet_name=f"Day {day}", index=False)
+        pools = []
+
+        class InlinePool:
+            def __init__(self, max_workers, mp_context):
+                pools.append(max_workers)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def map(self, *args):
+                return map(*args)
+
+        def read():
+            frame, counts = sheets.read_sheets(path, ['Day 1', 'Day 2', 'Day 3'], {})
+            self.assertEqual(counts, {'Day 1': 1, 'Day 2': 2, 'Day 3': 3})
+
+        held, release = threading.Event(), threading.Event()
+
+        def other_request():
+            with file_lock('sheet-parse/1'):
+                held.set()
+                release.wait(5)
+
+        with mock.patch.object(sheets.os, 'cpu_count', return_value=8), \
+                mock.patch.object(sheets, 'ProcessPoolExecutor', InlinePool):
+            read()
+            other = threading.Thread(target=other_request)
+            other.start()
+            held.wait(5)
+            # One slot left: parsed in this thread, no pool
+            read()
+            release.set()
+            other.join()
+            read()
+        self.assertEqual(pools, [2, 2])
+
+
+class UploadHeaderCheckTests(UploadTestCase):
+    """Files for the wrong process are turned away before the body has been read."""
+
+    def test_wrong_csv_header_is_rejected_early(self):
+        body = jio_csv(day=1, rows=50000).replace(b"S_No,Date", b"Serial,Date", 1)
+        upload = SimpleUploadedFile('wrong.csv', body)
+        response = self.client.post('/upload/?process=JIO', {'process': 'JIO', 'file': upload})
+
+        self.assertContains(response, "Upload failed: Column mismatched.")
+        self.assertTrue(response.wsgi_request.upload_rejection)
+        self.assertEqual(UploadedFile.objects.count(), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'uploads')))
+
+        upload = SimpleUploadedFile('right.csv', jio_csv(day=1))
+        response = self.client.post('/upload/?process=JIO', {'process': 'JIO', 'file': upload})
+        self.assertContains(response, "File uploaded and cleaned successfully!")
+
+    def test_rejected_upload_leaves_nothing_behind(self):
+        spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool, ignore_errors=True)
+        body = jio_csv(day=1, rows=50000).replace(b"S_No,Date", b"Serial,Date", 1)
+        # Big enough to be spooled to disk rather than held in memory
+        self.assertGreater(len(body), settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+
+        with override_settings(FILE_UPLOAD_TEMP_DIR=spool):
+            response = self.client.post('/upload/?process=JIO', {'process': 'JIO', 'file': SimpleUploadedFile('wrong.csv', body)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Upload failed: Column mismatched. \nPlease check the format.")
+        self.assertEqual(UploadedFile.objects.count(), 0)
+        self.assertEqual(os.listdir(spool), [])
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'uploads')))
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'clean')))
+
+    def test_wrong_workbook_header_is_rejected(self):
+        import pandas as pd
+
+        workbook = io.BytesIO()
+        pd.DataFrame({'Agent': ['a'], 'Minutes': [1]}).to_excel(workbook, index=False)
+        upload = SimpleUploadedFile('wrong.xlsx', workbook.getvalue())
+        response = self.client.post('/upload/?process=JIO', {'process': 'JIO', 'file': upload})
+
+        self.assertContains(response, "Upload failed: Column mismatched.")
+        self.assertTrue(response.wsgi_request.upload_rejection)
+        self.assertEqual(UploadedFile.objects.count(), 0)
+
+
+class AdminChangelistTests(UploadTestCase):
+    """Admin changelists over the large tables: status search and archive month choices."""
+
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+
+        # Changelist counts are cached per query
+        cache.clear()
+        User.objects.create_superuser('admin', password='secret')
+        self.client.login(username='admin', password='secret')
+
+    def test_status_search_by_process_and_date(self):
+        import datetime
+
+        for process in ('JIO', 'HDFC'):
+            for day in (1, 2):
+                UploadStatus.objects.create(process=process, date=datetime.date(2025, 9, day), status='Uploaded')
+
+        response = self.client.get('/admin/uploader/uploadstatus/', {'q': 'JIO', 'date__year': 2025, 'date__month': 9, 'date__day': 2})
+        self.assertEqual(
+            [(s.process, s.date) for s in response.context['cl'].result_list],
+            [('JIO', datetime.date(2025, 9, 2))],
+        )
+        response = self.client.get('/admin/uploader/uploadstatus/', {'q': 'HDFC'})
+        self.assertEqual({s.process for s in response.context['cl'].result_list}, {'HDFC'})
+
+    def test_archive_months_listed_by_calendar(self):
+        import datetime
+
+        upload = UploadedFile.objects.create(process='JIO', file='uploads/JIO/old.csv')
+        ArchivedFile.objects.create(uploaded_file=upload, kind='raw', month='2025-12', archive='archive/JIO/2025-12.zip')
+
+        with mock.patch('uploader.admin.timezone.localdate', return_value=datetime.date(2026, 2, 10)):
+            response = self.client.get('/admin/uploader/archivedfile/')
+        month_filter = next(f for f in response.context['cl'].filter_specs if getattr(f, 'parameter_name', None) == 'month')
+        months = [value for value, _ in month_filter.lookup_choices]
+        self.assertEqual(months[:4], ['2026-02', '2026-01', '2025-12', '2025-11'])
+        self.assertEqual((len(months), months[-1]), (24, '2024-03'))
+
+        response = self.client.get('/admin/uploader/archivedfile/', {'month': '2025-12'})
+        self.assertEqual([a.month for a in response.context['cl'].result_list], ['2025-12'])
+        response = self.client.get('/admin/uploader/archivedfile/', {'month': '2026-01'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+
+class StorageLayoutTests(UploadTestCase):
+    """Uploads and cleaned files are partitioned by day and upload id."""
+
+    def upload(self, day):
+        self.client.post('/upload/', {'process': 'JIO', 'file': SimpleUploadedFile('daily.csv', jio_csv(day=day))})
+        return UploadedFile.objects.latest('id')
+
+    def test_upload_is_stored_under_its_day_and_id(self):
+        uf = self.upload(day=1)
+        partition = f"{timezone.localdate(uf.uploaded_at):%Y/%m/%d}/{uf.id}"
+
+        self.assertEqual(uf.file.name, f"uploads/JIO/{partition}/daily.csv")
+        self.assertEqual(uf.cleaned_file, f"clean/JIO/APR_Clean/{partition}/daily__{uf.id}.csv")
+        self.assertTrue(os.path.isfile(cleaned_path_for(uf)))
+        self.assertEqual(self.client.get(f'/files/{uf.id}/download/').status_code, 200)
+
+    def test_migrate_storage_moves_flat_files(self):
+        with override_settings(STORAGE_LAYOUT='flat'):
+            first, second = self.upload(day=1), self.upload(day=2)
+        self.assertEqual(first.file.name, 'uploads/JIO/daily.csv')
+        self.assertEqual(os.path.dirname(second.file.name), 'uploads/JIO')
+
+        call_command('migrate_storage', batch_size=1, stdout=io.StringIO())
+
+        for before in (first, second):
+            uf = UploadedFile.objects.get(id=before.id)
+            partition = f"{timezone.localdate(uf.uploaded_at):%Y/%m/%d}/{uf.id}"
+            self.assertEqual(uf.file.name, f"uploads/JIO/{partition}/{os.path.basename(before.file.name)}")
+            self.assertTrue(os.path.isfile(uf.file.path))
+            self.assertFalse(os.path.exists(before.file.path))
+            self.assertEqual(os.path.dirname(uf.cleaned_file), f"clean/JIO/APR_Clean/{partition}")
+            self.assertTrue(os.path.isfile(cleaned_path_for(uf)))
+            self.assertEqual(self.client.get(f'/files/{uf.id}/download/clean/').status_code, 200)
+
+    def test_row_without_file_is_not_found_then_removed(self):
+        user = User.objects.get(username='uploader')
+        pending = serialized_write(UploadedFile.objects.create, user=user, process='JIO')
+
+        for url in (f'/files/{pending.id}/download/', f'/files/{pending.id}/download/clean/', f'/files/{pending.id}/preview/'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        # Still within the grace period: store_upload may be writing its file
+        call_command('apply_retention', stdout=io.StringIO())
+        self.assertTrue(UploadedFile.objects.filter(id=pending.id).exists())
+
+        UploadedFile.objects.filter(id=pending.id).update(uploaded_at=timezone.now() - timedelta(hours=2))
+        call_command('apply_retention', stdout=io.StringIO())
+        self.assertFalse(UploadedFile.objects.filter(id=pending.id).exists())
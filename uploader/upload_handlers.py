@@ -0,0 +1,299 @@
+"""
+Reject an upload for the wrong process while it is still arriving.
+
+The upload form posts to ?process=<name>, so the process is known before the
+body is parsed. HeaderCheckUploadHandler looks at the first
+UPLOAD_SNIFF_BYTES of the file -- the header line of a CSV, or the leading
+zip entries of an XLSX -- and compares the header row with the reference
+format. On a certain mismatch it stops reading the request; the view then
+reports request.upload_rejection. Anything it cannot decide within the window
+(e.g. an XLSX whose workbook part or shared strings come after the sheet
+data) is passed on, and validate_file checks it after the upload as before.
+
+What this saves is the parsing, spooling and storing of the rest of the file,
+not necessarily the transfer. Django only stops reading wsgi.input; the server
+decides what happens to the unread body. On a kept-alive gthread connection
+gunicorn reads and discards it before the next request, so the client still
+sends the whole file. The sync worker closes the socket instead, and the
+client may then see a connection reset rather than the error page. Setting
+"Connection: close" from the view does not help: WSGI servers drop
+hop-by-hop headers set by the application.
+"""
+import csv
+import html
+import logging
+import os
+import re
+import struct
+import zlib
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from .paths import reference_format_path
+from .sheets import header_signature, reference_signature
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = ('csv', 'xlsx')
+MISMATCH = "Column mismatched. \nPlease check the format."
+UNKNOWN = object()  # Shared string not received yet
+
+
+class HeaderCheckUploadHandler(FileUploadHandler):
+    """Passes every chunk on unchanged; raises StopUpload once the header is known to be wrong."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.process_name = self.request.GET.get('process') if self.request is not None else None
+        self.sniffer = None
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.sniffer = None
+        if field_name != 'file' or not self.process_name:
+            return
+        ext = file_name.split('.')[-1].lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            self.reject(f"Invalid file type: {ext}. \nAllowed types: .csv, .xlsx")
+        if not os.path.exists(reference_format_path(self.process_name)):
+            return
+        signature = reference_signature(self.process_name)
+        limit = settings.UPLOAD_SNIFF_BYTES
+        if ext == 'csv':
+            self.sniffer = CsvHeaderSniffer(signature, limit)
+        else:
+            pattern = getattr(settings, 'SHEET_NAME_PATTERNS', {}).get(self.process_name)
+            self.sniffer = XlsxHeaderSniffer(signature, pattern, limit)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.sniffer is not None:
+            verdict = self.sniffer.feed(raw_data)
+            if verdict is not None:
+                self.sniffer = None
+                if verdict:
+                    self.reject(verdict)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # The whole file is here by now; validate_file has the last word
+        self.sniffer = None
+        return None
+
+    def reject(self, message):
+        """Stop parsing the upload; see the module docstring for what happens to the rest of the body."""
+        logger.info(f"Upload of '{self.file_name}' for {self.process_name} rejected while receiving: {message!r}")
+        self.request.upload_rejection = message
+        # Don't read the rest of the body
+        raise StopUpload(connection_reset=True)
+
+
+class CsvHeaderSniffer:
+    """
+    feed() returns None while more data is needed, '' when the header matches
+    or cannot be judged, and an error message when it does not match.
+    """
+
+    def __init__(self, signature, limit):
+        self.signature = signature
+        self.limit = limit
+        self.buffer = b''
+
+    def feed(self, data):
+        self.buffer += data
+        end = self.buffer.find(b'\n')
+        # A newline inside a quoted header cell doesn't end the row
+        while end != -1 and self.buffer.count(b'"', 0, end) % 2:
+            end = self.buffer.find(b'\n', end + 1)
+        if end == -1:
+            return '' if len(self.buffer) >= self.limit else None
+
+        line = self.buffer[:end].removeprefix(b'\xef\xbb\xbf').rstrip(b'\r')
+        try:
+            text = line.decode('utf-8')
+        except UnicodeDecodeError:
+            return ''
+        if not text.strip():
+            # pandas skips leading blank lines; leave those files to validate_file
+            return ''
+        row = next(csv.reader([text]), [])
+        return '' if header_signature(row) == self.signature else MISMATCH
+
+
+class XlsxHeaderSniffer:
+    """
+    Same contract as CsvHeaderSniffer. Judges the first sheet, once the workbook
+    part says which sheet that is and whether other sheets could be cleaned instead.
+    """
+
+    def __init__(self, signature, name_pattern, limit):
+        self.signature = signature
+        self.name_pattern = name_pattern
+        self.limit = limit
+        self.buffer = b''
+
+    def feed(self, data):
+        self.buffer += data
+        if len(self.buffer) >= 4 and not self.buffer.startswith(b'PK\x03\x04'):
+            return "Could not read uploaded file"
+        verdict = self.verdict(dict(zip_prefix_entries(self.buffer, self.limit)))
+        if verdict is None and len(self.buffer) >= self.limit:
+            return ''
+        return verdict
+
+    def verdict(self, parts):
+        sheets = workbook_sheets(parts.get('xl/workbook.xml'), parts.get('xl/_rels/workbook.xml.rels'))
+        if sheets is None:
+            return None
+        if not sheets:
+            return ''
+        (first_name, first_part), names = sheets[0], [name for name, _ in sheets]
+        if self.name_pattern:
+            # The first sheet decides when it is selected by name, or when no sheet is
+            decisive = re.search(self.name_pattern, first_name) or not any(re.search(self.name_pattern, n) for n in names)
+        else:
+            # Otherwise any other sheet with the right header would be cleaned instead
+            decisive = len(sheets) == 1
+        if not decisive:
+            return ''
+
+        row = first_row(parts.get(first_part))
+        if row is None:
+            return None
+        if row is False:
+            return ''
+        strings = shared_strings(parts.get(shared_strings_part(parts.get('xl/_rels/workbook.xml.rels'))))
+        cells = [strings[c.index] if isinstance(c, SharedString) and c.index < len(strings) else
+                 UNKNOWN if isinstance(c, SharedString) else c for c in row]
+        while cells and cells[-1] is not UNKNOWN and not cells[-1].strip():
+            cells.pop()
+        if len(cells) != len(self.signature):
+            return MISMATCH
+        if any(c is not UNKNOWN and c.strip().lower() != s for c, s in zip(cells, self.signature)):
+            return MISMATCH
+        return None if UNKNOWN in cells else ''
+
+
+def zip_prefix_entries(data, max_length):
+    """
+    (name, content) for the zip entries whose local headers are in `data`, in
+    file order. Contents are decompressed as far as `data` goes, up to
+    `max_length` bytes each.
+    """
+    pos = 0
+    while len(data) - pos >= 30 and data[pos:pos + 4] == b'PK\x03\x04':
+        flags, method, csize, name_len, extra_len = struct.unpack('<2xHH8xI4xHH', data[pos + 4:pos + 30])
+        name = data[pos + 30:pos + 30 + name_len].decode('utf-8', 'replace')
+        start = pos + 30 + name_len + extra_len
+        streamed = flags & 0x08  # Sizes follow the data instead
+        if csize == 0xFFFFFFFF or (streamed and method != 8) or method not in (0, 8):
+            return
+        body = data[start:] if streamed else data[start:start + csize]
+        if method == 0:
+            yield name, body[:max_length]
+            pos = start + csize
+            continue
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        try:
+            content = inflater.decompress(body, max_length)
+        except zlib.error:
+            return
+        yield name, content
+        if not streamed:
+            pos = start + csize
+        elif inflater.eof:
+            pos = len(data) - len(inflater.unused_data)
+            pos += 16 if data[pos:pos + 4] == b'PK\x07\x08' else 12
+        else:
+            return
+
+
+def xml_attrs(tag):
+    return {k.split(':')[-1] if k.endswith(':id') else k: v for k, v in re.findall(r'([\w:]+)="([^"]*)"', tag)}
+
+
+def workbook_sheets(workbook, rels):
+    """[(sheet name, zip part)] in workbook order; None until both parts have arrived."""
+    if not workbook or not rels or b'</sheets>' not in workbook or b'</Relationships>' not in rels:
+        return None
+    targets = {}
+    for tag in re.findall(rb'<(?:\w+:)?Relationship\b([^>]*)>', rels):
+        attrs = xml_attrs(tag.decode('utf-8', 'replace'))
+        target = attrs.get('Target', '')
+        targets[attrs.get('Id')] = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    sheets = []
+    for tag in re.findall(rb'<(?:\w+:)?sheet\b([^>]*)>', workbook):
+        attrs = xml_attrs(tag.decode('utf-8', 'replace'))
+        sheets.append((html.unescape(attrs.get('name', '')), targets.get(attrs.get('id'))))
+    return sheets
+
+
+def shared_strings_part(rels):
+    for tag in re.findall(rb'<(?:\w+:)?Relationship\b([^>]*)>', rels or b''):
+        attrs = xml_attrs(tag.decode('utf-8', 'replace'))
+        if attrs.get('Type', '').endswith('/sharedStrings'):
+            target = attrs.get('Target', '')
+            return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    return None
+
+
+def shared_strings(xml):
+    """The complete <si> items at the start of the shared strings part."""
+    items = []
+    for item in re.findall(rb'<(?:\w+:)?si>(.*?)</(?:\w+:)?si>', xml or b'', re.S):
+        # Phonetic runs are not part of the cell text
+        item = re.sub(rb'<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>', b'', item, flags=re.S)
+        texts = re.findall(rb'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', item, re.S)
+        items.append(html.unescape(b''.join(texts).decode('utf-8', 'replace')))
+    return items
+
+
+class SharedString:
+    def __init__(self, index):
+        self.index = index
+
+
+def column_index(ref):
+    letters = re.match(r'[A-Z]+', ref or '')
+    if not letters:
+        return None
+    index = 0
+    for ch in letters.group():
+        index = index * 26 + ord(ch) - 64
+    return index - 1
+
+
+def first_row(sheet_xml):
+    """
+    Cells of row 1 as strings or SharedString references. None until the row
+    has arrived; False when it can't be judged here (numbers, dates, formulas
+    or a sheet not starting at row 1).
+    """
+    if not sheet_xml:
+        return None
+    match = re.search(rb'<(?:\w+:)?row\b([^>]*?)(/>|>(.*?)</(?:\w+:)?row>)', sheet_xml, re.S)
+    if match is None:
+        return False if b'</sheetData>' in sheet_xml or b'<sheetData/>' in sheet_xml else None
+    if xml_attrs(match.group(1).decode()).get('r', '1') != '1':
+        return False
+    cells = []
+    for attrs, body in re.findall(rb'<(?:\w+:)?c\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)', match.group(3) or b'', re.S):
+        attrs = xml_attrs(attrs.decode('utf-8', 'replace'))
+        position = column_index(attrs.get('r'))
+        if position is not None:
+            cells.extend([''] * (position - len(cells)))
+        kind = attrs.get('t', 'n')
+        value = re.search(rb'<(?:\w+:)?v>(.*?)</(?:\w+:)?v>', body, re.S)
+        if b'<f' in body:
+            return False
+        if kind == 's' and value:
+            cells.append(SharedString(int(value.group(1))))
+        elif kind == 'inlineStr':
+            texts = re.findall(rb'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', body, re.S)
+            cells.append(html.unescape(b''.join(texts).decode('utf-8', 'replace')))
+        elif kind in ('str', 'e') and value:
+            cells.append(html.unescape(value.group(1).decode('utf-8', 'replace')))
+        elif kind == 'b' and value:
+            cells.append('true' if value.group(1).strip() == b'1' else 'false')
+        elif value:
+            return False
+        else:
+            cells.append('')
+    return cells
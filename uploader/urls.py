@@ -1,10 +1,16 @@
 from django.urls import path
 from .views import upload_file
-from .views import upload_file, user_login, user_logout
+from .views import upload_file, user_login, user_logout, download_file, download_format
+from .views import preview_file, preview_api
 
 urlpatterns = [
     path('upload/', upload_file, name='upload_file'),
     path('login/', user_login, name='login'),
     path('', user_login, name='login'),
     path('logout/', user_logout, name='logout'),
+    path('files/<int:pk>/download/', download_file, {'kind': 'raw'}, name='download_file'),
+    path('files/<int:pk>/download/clean/', download_file, {'kind': 'clean'}, name='download_cleaned'),
+    path('files/<int:pk>/preview/', preview_file, name='preview_file'),
+    path('api/files/<int:pk>/rows/', preview_api, name='preview_api'),
+    path('format/<str:process>/', download_format, name='download_format'),
 ]
@@ -1,21 +1,24 @@
 import pandas as pd
 import numpy as np
+import hashlib
 import os
+import re
 from django.conf import settings
 import datetime
 import logging
-from django.core.mail import send_mail
-
-# Configure logging once (ideally in settings or a main script)
-LOG_DIR = os.path.join(settings.MEDIA_ROOT, 'logs')
-os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE = os.path.join(LOG_DIR, 'cleaning_errors.log')
-
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.ERROR,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from django.db.models import Max
+from .db import serialized_write
+from .fsutil import write_atomic
+from .locks import multi_lock
+from .models import AgentDailyMinutes, FailureNotification, UploadStatus
+from .publish import status_lock_names
+from .registry import get_process_mapping
+from .paths import cleaned_path, reference_format_path
+from .preview import build_row_index
+from .profiles import load_profile, read_kwargs, refine_profile
+from .sheets import read_sheets, select_sheets
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = ['csv', 'xlsx']
 
@@ -27,7 +30,7 @@ def validate_file(uploaded_file, process_name):
     if file_ext not in ALLOWED_EXTENSIONS:
         return False, f"Invalid file type: {file_ext}. \nAllowed types: .csv, .xlsx"
 
-    reference_file_path = os.path.join(settings.MEDIA_ROOT, "reference", process_name, "format.xlsx")
+    reference_file_path = reference_format_path(process_name)
     if not os.path.exists(reference_file_path):
         return False, f"Reference format file not found for process: {process_name}"
 
@@ -41,12 +44,24 @@ def validate_file(uploaded_file, process_name):
         if len(reference_df.columns) == 0:
             return False, "Reference format file has no column headers."
 
+        # Workbooks: the sheets picked by name pattern or header must all match the reference
+        if file_ext == "xlsx":
+            try:
+                sheets, mismatched = select_sheets(uploaded_file, process_name)
+            except Exception:
+                return False, "Could not read uploaded file"
+            if mismatched:
+                return False, f"Column mismatched in sheet(s): {', '.join(mismatched)}. \nPlease check the format."
+            if len(sheets) > 1:
+                return True, "File is valid"
+
         # Read only header from uploaded file
         try:
             if file_ext == "csv":
-                uploaded_df = pd.read_csv(uploaded_file)
+                # Runs before clean() and its memory budget; never load the rows here
+                uploaded_df = pd.read_csv(uploaded_file, nrows=0)
             else:
-                uploaded_df = pd.read_excel(uploaded_file, engine="openpyxl", nrows=0)
+                uploaded_df = pd.read_excel(uploaded_file, engine="openpyxl", nrows=0, sheet_name=sheets[0] if sheets else 0)
         except Exception as e:
             return False, "Could not read uploaded file"
 
@@ -91,18 +106,36 @@ def time_to_minutes(time_val):
 
     return time_val  # Default fallback
 
-def send_failure_email(subject, message):
-    """Send an email when cleaning fails."""
+MAX_NOTIFICATION_FILES = 50
+
+
+def notify_failure(process_name, reason, file_path, detail=None):
+    """
+    Queue a cleaning failure in the notification outbox.
+
+    Never talks to SMTP; the send_failure_notifications command mails batched
+    digests. A repeat of an unsent (process, reason) only bumps its count.
+    """
+    line = f"{file_path} - {detail}" if detail else str(file_path)
+
+    def record():
+        pending = FailureNotification.objects.filter(
+            process=process_name, reason=reason[:255], sent_at__isnull=True
+        ).first()
+        if pending is None:
+            FailureNotification.objects.create(process=process_name, reason=reason[:255], files=line)
+        else:
+            files = pending.files.splitlines()
+            if len(files) < MAX_NOTIFICATION_FILES:
+                files.append(line)
+            pending.files = "\n".join(files)
+            pending.occurrences += 1
+            pending.save(update_fields=['files', 'occurrences', 'last_seen'])
+
     try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,  # Make sure this is set in Django settings
-            ['ishita.jain@iccs.in'],
-            fail_silently=False
-        )
-    except Exception as mail_err:
-        logging.error(f"Failed to send error email: {mail_err}")
+        serialized_write(record)
+    except Exception as e:
+        logger.error(f"Failed to queue failure notification: {e}")
 
 
 # JVVNL-specific time normalization
@@ -148,46 +181,319 @@ def normalize_jvvnl_time(val):
     except Exception:
         return "00:00:00"
 
-def clean(file_path, process_name):
+# Memory-aware loading
+CLEAN_MEMORY_BUDGET_MB = getattr(settings, 'CLEAN_MEMORY_BUDGET_MB', 512)
+MEMORY_SAMPLE_ROWS = 2000
+CATEGORY_MAX_RATIO = 0.5
+FLOAT32_EXACT_LIMIT = 2 ** 24
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when an upload is estimated to need more memory than the per-upload budget."""
+
+
+def is_text_column(series):
+    return series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def plan_dtypes(sample, protected=()):
+    """Pick categorical dtypes for low-cardinality text columns based on a row sample."""
+    dtypes = {}
+    for col in sample.columns:
+        if col in protected or sample[col].dtype != object:
+            continue
+        values = sample[col].dropna()
+        if len(values) and values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+            dtypes[col] = 'category'
+    return dtypes
+
+
+def compact_frame(df, protected=()):
+    """Downcast numerics and turn low-cardinality text columns into categoricals, in place."""
+    categorical = plan_dtypes(df, protected)
+    for col in df.columns:
+        if col in protected:
+            continue
+        series = df[col]
+        if col in categorical:
+            df[col] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            # Only whole numbers that float32 holds exactly, so the CSV output is unchanged
+            values = series.dropna()
+            if ((values % 1 == 0) & (values.abs() <= FLOAT32_EXACT_LIMIT)).all():
+                df[col] = series.astype('float32')
+    return df
+
+
+def sample_upload(file_path, sample_rows=MEMORY_SAMPLE_ROWS, sheets=None, **read_options):
+    """
+    Read the first rows of an upload and estimate how many rows the whole file has
+    (for a workbook, across `sheets`; by default its first sheet).
+    """
+    ext = file_path.split('.')[-1].lower()
+    file_size = os.path.getsize(file_path)
+
+    if ext == 'csv':
+        sample = pd.read_csv(file_path, nrows=sample_rows, **read_options)
+        with open(file_path, 'rb') as f:
+            sampled_bytes = sum(len(f.readline()) for _ in range(len(sample) + 1))
+        if sampled_bytes >= file_size or not len(sample):
+            return sample, len(sample)
+        return sample, int(file_size / sampled_bytes * (len(sample) + 1))
+
+    import openpyxl
+    sheets = sheets or [0]
+    sample = pd.read_excel(file_path, engine='openpyxl', nrows=sample_rows, sheet_name=sheets[0], **read_options)
+    workbook = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        worksheets = [workbook.worksheets[s] if isinstance(s, int) else workbook[s] for s in sheets]
+        row_counts = [ws.max_row for ws in worksheets]
+    finally:
+        workbook.close()
+    if not all(row_counts):
+        # No dimension record in a sheet; assume ~10x compression
+        total_rows = int(file_size * 10 / max(sample.memory_usage(deep=True).sum() / max(len(sample), 1), 1))
+        return sample, max(total_rows - 1, len(sample))
+    return sample, max(sum(row_counts) - len(row_counts), len(sample))
+
+
+def estimate_frame_memory(sample, total_rows, protected=()):
+    """Estimated bytes needed to hold the full upload with compact dtypes."""
+    if not len(sample):
+        return 0
+    compact = compact_frame(sample.copy(), protected)
+    per_row = compact.memory_usage(deep=True, index=False).sum() / len(sample)
+    return int(per_row * total_rows)
+
+
+def load_upload(file_path, protected=(), budget_mb=None, profile=None, sheets=None):
+    """
+    Load an uploaded CSV/XLSX with compact dtypes.
+
+    Low-cardinality text columns are read as categoricals and numerics are
+    downcast; columns in `protected` are left as pandas infers them. With a
+    read profile the known delimiter, encoding, text dtypes and unused
+    columns are passed straight to the parser; if the file no longer fits
+    the profile it is read without one. Raises MemoryBudgetExceeded when the
+    estimated frame size is over budget.
+
+    Workbooks are read from their first sheet, or from `sheets` (names) which
+    are parsed in parallel and stacked; df.attrs['sheet_rows'] then holds the
+    rows read per sheet.
+    """
+    ext = file_path.split('.')[-1].lower()
+    options = read_kwargs(profile, ext, protected)
+    try:
+        return _load_upload(file_path, ext, protected, budget_mb, options, sheets)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        if not options:
+            raise
+        logger.warning(f"Upload does not match its read profile, reading without it: {e}")
+        return _load_upload(file_path, ext, protected, budget_mb, {}, sheets)
+
+
+def _load_upload(file_path, ext, protected, budget_mb, options, sheets=None):
+    budget_mb = CLEAN_MEMORY_BUDGET_MB if budget_mb is None else budget_mb
+
+    sample, total_rows = sample_upload(file_path, sheets=sheets if ext != 'csv' else None, **options)
+    estimated = estimate_frame_memory(sample, total_rows, protected)
+    if budget_mb and estimated > budget_mb * 1024 * 1024:
+        raise MemoryBudgetExceeded(
+            f"File needs an estimated {estimated / (1024 * 1024):.0f} MB in memory "
+            f"(~{total_rows} rows), over the {budget_mb} MB per-upload limit. "
+            f"Please split it into smaller files."
+        )
+
+    if ext == 'csv':
+        dtypes = {**options.pop('dtype', {}), **plan_dtypes(sample, protected)}
+        df = pd.read_csv(file_path, dtype=dtypes or None, **options)
+    elif sheets and len(sheets) > 1:
+        df, sheet_rows = read_sheets(file_path, sheets, options)
+        df = compact_frame(df, protected)
+        df.attrs['sheet_rows'] = sheet_rows
+        return df
+    else:
+        df = pd.read_excel(file_path, engine='openpyxl', sheet_name=sheets[0] if sheets else 0, **options)
+    return compact_frame(df, protected)
+
+
+def apply_unique(series, func):
+    """series.apply(func), calling func once per distinct value rather than once per row."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = pd.Series(np.asarray(uniques, dtype=object)).apply(func)
+    return pd.Series(mapped.to_numpy().take(codes), index=series.index)
+
+
+def rows_matching(df, pattern, strip=False):
+    """
+    Boolean mask of rows where any text cell matches `pattern`.
+
+    Scans one column at a time (categoricals only through their categories)
+    instead of building a string copy of the whole frame. Numeric and date
+    columns are skipped since their string forms cannot contain the labels
+    we look for.
+    """
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern, re.IGNORECASE)
+
+    mask = np.zeros(len(df), dtype=bool)
+    for col in range(df.shape[1]):
+        series = df.iloc[:, col]
+        if not is_text_column(series):
+            continue
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories.astype(str).to_series()
+            if strip:
+                categories = categories.str.strip()
+            hits = np.flatnonzero(categories.str.contains(pattern, na=False).to_numpy())
+            mask |= np.isin(series.cat.codes.to_numpy(), hits)
+        else:
+            values = series.astype(str)
+            if strip:
+                values = values.str.strip()
+            mask |= values.str.contains(pattern, na=False).to_numpy()
+    return pd.Series(mask, index=df.index)
+
+# Agent column names seen across client exports, matched case-insensitively
+AGENT_COLUMN_CANDIDATES = [
+    'agent', 'agent name', 'agentname', 'agent_name',
+    'user name', 'user_name', 'username', 'agent id', 'agentid', 'user id',
+]
+
+
+def find_agent_column(columns):
+    lookup = {str(c).strip().lower(): c for c in columns}
+    for candidate in AGENT_COLUMN_CANDIDATES:
+        if candidate in lookup:
+            return lookup[candidate]
+    return None
+
+
+def save_minutes_aggregate(process_name, df, upload_id=None):
+    """
+    Replace the per-agent, per-day totals of the "Minutes" column in AgentDailyMinutes.
+
+    Expects the "Raw Date" (dd-mm-YYYY) and "Minutes" columns computed by clean().
+    Only dates this upload owns are written, under the same rule and locks as
+    record_upload_dates: a date whose status or totals come from a newer upload
+    (higher id) is left alone. Without an upload id only dates nobody owns yet
+    are written. Returns the number of aggregate rows written.
+    """
+    agent_col = find_agent_column(df.columns)
+    if agent_col is not None:
+        agents = df[agent_col].astype(str).str.strip().replace({'nan': '', 'None': ''})
+    else:
+        agents = pd.Series('', index=df.index)
+
+    frame = pd.DataFrame({
+        'date': pd.to_datetime(df['Raw Date'], format='%d-%m-%Y', errors='coerce'),
+        'agent': agents.str.slice(0, 255),
+        'minutes': df['Minutes'],
+    }).dropna(subset=['date'])
+    if frame.empty:
+        return 0
+
+    totals = frame.groupby(['date', 'agent'], sort=False)['minutes'].agg(['sum', 'size']).reset_index()
+    rows = [
+        AgentDailyMinutes(
+            process=process_name,
+            date=date.date(),
+            agent=agent,
+            minutes=int(minutes),
+            row_count=int(count),
+            uploaded_file_id=upload_id,
+        )
+        for date, agent, minutes, count in totals.itertuples(index=False)
+    ]
+    dates = {row.date for row in rows}
+
+    def replace_owned():
+        owners = {}
+        for model in (UploadStatus, AgentDailyMinutes):
+            claimed = model.objects.filter(process=process_name, date__in=dates).values('date').annotate(owner=Max('uploaded_file_id'))
+            for entry in claimed:
+                owners[entry['date']] = max(owners.get(entry['date'], 0), entry['owner'] or 0)
+        owned = {d for d in dates if owners.get(d, 0) <= (upload_id or 0)}
+        # Delete first so agents missing from a corrected upload drop out too
+        AgentDailyMinutes.objects.filter(process=process_name, date__in=owned).delete()
+        written = [row for row in rows if row.date in owned]
+        AgentDailyMinutes.objects.bulk_create(written, batch_size=500)
+        return len(written)
+
+    with multi_lock(status_lock_names(process_name, dates)):
+        return serialized_write(replace_owned)
+
+# Bump whenever a change to clean() alters its output for the same input;
+# `manage.py reclean` regenerates everything cleaned under an older version.
+CLEAN_RULES_VERSION = 1
+
+def clean_fingerprint(file_path):
+    """'v<rules version>:<sha256 of the raw upload>', stored on UploadedFile after cleaning."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return f"v{CLEAN_RULES_VERSION}:{digest.hexdigest()}"
+
+def clean(file_path, process_name, upload_id=None, legacy_output=False, learn=True):
+    """
+    Clean an upload into its CSV under APR_Clean. Returns (success, message, output path).
+
+    `upload_id` names the output and decides which dates' minutes aggregates this
+    upload may write (only those no newer upload owns). `legacy_output` keeps the
+    pre-upload-id output name; `learn=False` leaves the read profile alone, for
+    re-cleaning old files.
+    """
     try:
 
         # Step 1: Load mapping
-        map_path = os.path.join(settings.MEDIA_ROOT, 'Map', 'map.csv')
-        if not os.path.exists(map_path):
+        try:
+            mapping = get_process_mapping(process_name)
+        except FileNotFoundError:
             msg = "Mapping file not found"
-            send_failure_email(
-                f"Cleaning Failed - {process_name}",
-                f"File: {file_path}\nReason: {msg}"
-            )
+            notify_failure(process_name, msg, file_path)
             return False, "Mapping file not found", file_path
 
-        mapping_df = pd.read_csv(map_path, header=None)
-        process_row = mapping_df[mapping_df[0].str.strip().str.lower() == process_name.strip().lower()]
-        
-        if process_row.empty:
+        if mapping is None:
             msg = f"No mapping found for process: {process_name}"
-            send_failure_email(
-                f"Cleaning Failed - {process_name}",
-                f"File: {file_path}\nReason: {msg}"
-            )
+            notify_failure(process_name, msg, file_path)
             return False, f"No mapping found for process: {process_name}", file_path
 
-        login_col = process_row.iloc[0, 1]
-        break_col = process_row.iloc[0, 2]
-        first_login_col = process_row.iloc[0, 3]
+        login_col = mapping['login_col']
+        break_col = mapping['break_col']
+        first_login_col = mapping['first_login_col']
        
-        # Step 2: Load uploaded file
-        ext = file_path.split('.')[-1].lower()
-        if ext == 'csv':
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path, engine='openpyxl')
+        # Workbooks: every sheet matching the process's name pattern or reference header
+        sheets = None
+        if file_path.lower().endswith('.xlsx'):
+            try:
+                sheets, _ = select_sheets(file_path, process_name)
+            except Exception as e:
+                logger.warning(f"Could not select sheets, reading the first one: {e}")
+
+        # Step 2: Load uploaded file (compact dtypes, within the memory budget)
+        try:
+            df = load_upload(
+                file_path,
+                protected=[login_col, break_col, first_login_col] + JVVNL_TIME_COLS,
+                profile=load_profile(process_name),
+                sheets=sheets or None,
+            )
+        except MemoryBudgetExceeded as e:
+            notify_failure(process_name, "Upload over memory budget", file_path, detail=str(e))
+            return False, str(e), file_path
         
+        # Which sheet each row came from, so footer rows are cut per sheet
+        sheet_rows = df.attrs.get('sheet_rows') or {}
+        sheet_of = pd.Series(np.repeat(np.arange(len(sheet_rows)), list(sheet_rows.values())) if sheet_rows else 0, index=df.index)
+
         # Special handling for JVVNL
         if process_name.strip().lower() == "jvvnl":
             for col in JVVNL_TIME_COLS:
                 if col in df.columns:
-                    df[col] = df[col].apply(normalize_jvvnl_time)
+                    df[col] = apply_unique(df[col], normalize_jvvnl_time)
 
         # Step 3: Check if required columns exist
         # if login_col not in df.columns or break_col not in df.columns or first_login_col not in df.columns:
@@ -205,51 +511,45 @@ def clean(file_path, process_name):
             str(break_col).strip().lower() not in df_columns_lower or
             str(first_login_col).strip().lower() not in df_columns_lower):
             msg = "One or more required columns not found"
-            send_failure_email(
-                f"Cleaning Failed - {process_name}",
-                f"File: {file_path}\nReason: {msg}"
-            )
+            notify_failure(process_name, msg, file_path)
             return False, "One or more required columns not found", file_path
 
+        # Learn from this upload so the next one of this process reads faster
+        if learn:
+            try:
+                refine_profile(process_name, df, file_path)
+            except Exception as e:
+                logger.error(f"Could not update read profile for process '{process_name}': {e}")
+
         # Step 5: Remove rows after "Total" or "Admin"
         exempted_processes = ['Mpokket Collection APR', 'Mpokket Collection Breakcode']
 
         if process_name.strip() in exempted_processes:
-            import re
             # Match whole word 'admin', 'total', 'grand total' only (not if followed by parentheses, dash, etc.)
             pattern = re.compile(r'\b(admin|total|grand total)\b(?![\(\-\w])', re.IGNORECASE)
-
-            def should_exclude(cell):
-                if not isinstance(cell, str):
-                    return False
-                return bool(pattern.search(cell.strip()))
-
-            mask = df.astype(str).applymap(should_exclude).any(axis=1)
-            total_row_index = df[mask].index
+            mask = rows_matching(df, pattern, strip=True)
         else:
-            mask = df.astype(str).apply(lambda row: row.str.contains('Total|Admin', case=False, na=False), axis=1)
-            total_row_index = df[mask.any(axis=1)].index
-
-        if len(total_row_index) > 0:
-            df = df.iloc[:total_row_index[0]]
+            mask = rows_matching(df, 'Total|Admin')
+        # Keep each sheet's rows above its first matching row
+        df = df[~mask.groupby(sheet_of).cummax().astype(bool)]
 
         # New Step: Remove rows containing "Campaign Summary"
-        df = df[~df.astype(str).apply(lambda row: row.str.contains("Campaign Summary|Summary|NoAgent", case=False, na=False)).any(axis=1)]
+        df = df[~rows_matching(df, "Campaign Summary|Summary|NoAgent")]
 
         if process_name.strip().lower() == "meity" and "AGENT_NAME" in df.columns:
             df = df[~df["AGENT_NAME"].astype(str).str.strip().str.lower().isin(["null", "nan", "none", ""])]
 
         if process_name.strip().lower() == "dish tv-backend" or process_name.strip().lower() == "dish ib-chennai":
-            # Drop last row 
-            df = df.iloc[:-1] if not df.empty else df
+            # Drop last row (of each sheet)
+            df = df[sheet_of.loc[df.index].duplicated(keep='last')]
         
         # Special cleaning for D2H & Dish 44 - Server
         if process_name.strip().lower() in ["d2h & dish 44 - server"]:
-            df = df[~df.astype(str).apply(lambda row: row.str.contains("Day Total", case=False, na=False)).any(axis=1)]
+            df = df[~rows_matching(df, "Day Total")]
 
         # Step 4: Time conversion and filtering
-        df["Login Duration (minutes)"] = df[login_col].apply(time_to_minutes)
-        df["Total Break Duration (minutes)"] = df[break_col].apply(time_to_minutes)
+        df["Login Duration (minutes)"] = apply_unique(df[login_col], time_to_minutes)
+        df["Total Break Duration (minutes)"] = apply_unique(df[break_col], time_to_minutes)
         df["Minutes"] = df["Login Duration (minutes)"] - df["Total Break Duration (minutes)"]
         # df = df[df["Minutes"] != 0.0]
         
@@ -290,10 +590,15 @@ def clean(file_path, process_name):
         #         return None   # or "" if you want string
         #     return parsed.strftime('%d-%m-%Y')
         
-        df['Raw Date'] = df[first_login_col].apply(extract_or_convert)
+        df['Raw Date'] = apply_unique(df[first_login_col], extract_or_convert)
         df['Minutes'] = np.ceil(df['Minutes']).fillna(0).astype(int)
 
-        
+        # Keep the minutes calculation as a per-agent, per-day aggregate for reporting
+        try:
+            save_minutes_aggregate(process_name, df, upload_id)
+        except Exception as e:
+            logger.error(f"Could not save minutes aggregate for process '{process_name}': {e}")
+
 
         # Step 8: Drop intermediate calculation columns
         df.drop(['Login Duration (minutes)', 'Total Break Duration (minutes)', 'Minutes'], axis=1, inplace=True, errors='ignore')
@@ -303,20 +608,27 @@ def clean(file_path, process_name):
         df = df.loc[:, ~(df == '').all()]                # Drop columns with all empty strings
 
         # Step 9: Save final cleaned file
-        clean_dir = os.path.join(settings.MEDIA_ROOT, 'clean', process_name, 'APR_Clean')
-        os.makedirs(clean_dir, exist_ok=True)
-        cleaned_path = os.path.join(clean_dir, os.path.basename(file_path).rsplit('.', 1)[0] + '.csv')
-        df.to_csv(cleaned_path, index=False)
+        output_path = cleaned_path(process_name, file_path, None if legacy_output else upload_id)
+        # A concurrent reader never sees half a file
+        write_atomic(output_path, lambda tmp: df.to_csv(tmp, index=False))
 
-        return True, f"Cleaned file saved at: {cleaned_path}", cleaned_path
+        # Row offset index for paged previews
+        try:
+            build_row_index(output_path)
+        except Exception as e:
+            logger.error(f"Could not build row index for '{output_path}': {e}")
+
+        msg = f"Cleaned {len(df)} rows"
+        if len(sheet_rows) > 1:
+            cleaned_rows = sheet_of.loc[df.index].value_counts()
+            per_sheet = ", ".join(f"{name}: {cleaned_rows.get(i, 0)}" for i, name in enumerate(sheet_rows))
+            msg += f" from {len(sheet_rows)} sheets ({per_sheet})"
+        return True, msg, output_path
 
     except Exception as e:
         error_msg = f"Error during cleaning for process '{process_name}', file '{os.path.basename(file_path)}': {str(e)}"
-        send_failure_email(
-            f"Cleaning Failed - {process_name}",
-            f"File: {file_path}\nError: {str(e)}"
-        )
-        logging.error(
+        notify_failure(process_name, f"{type(e).__name__}: {e}", file_path)
+        logger.error(
             f"Error during cleaning for process '{process_name}', "
             f"file '{os.path.basename(file_path)}': {str(e)}"
         )
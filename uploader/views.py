@@ -1,16 +1,22 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_safe
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from .forms import UploadFileForm
 from .models import UploadedFile
-from .utils import validate_file
-from .utils import clean
+from .log import log_context
+from .registry import get_process_options
+from .publish import cleaned_dates, record_upload_dates, publish_to_portal
+from .db import serialized_write
+from .downloads import serve_file, serve_archived
+from .preview import read_page, DEFAULT_PAGE_SIZE
+from .paths import cleaned_path_for, reference_format_path
 from django.conf import settings
 import os
-import csv
-import shutil
 import logging
-import pandas as pd
+
+logger = logging.getLogger(__name__)
 
 def user_login(request):
     if request.method == "POST":
@@ -34,17 +40,18 @@ def upload_file(request):
     message = ""
     error = ""
 
-    # Read options from media/process/process.csv
-    process_options = []
-    csv_path = os.path.join(settings.MEDIA_ROOT, 'process', 'process.csv')
-    if os.path.exists(csv_path):
-        with open(csv_path, newline='') as f:
-            reader = csv.reader(f)
-            process_options = [row[0] for row in reader if row]
+    # Options from media/process/process.csv
+    process_options = get_process_options()
 
     if request.method == "POST":
+        # Cleaning code pulls in pandas; only import it when a file is posted
+        from .utils import validate_file
         form = UploadFileForm(request.POST, request.FILES)
-        if form.is_valid():
+        # Set when HeaderCheckUploadHandler stopped the upload part-way
+        rejection = getattr(request, 'upload_rejection', '')
+        if rejection:
+            error = f"Upload failed: {rejection}"
+        elif form.is_valid():
             uploaded_file = request.FILES['file']
             process_name = request.POST.get("process") 
             is_valid, msg = validate_file(uploaded_file, process_name)
@@ -55,79 +62,16 @@ def upload_file(request):
                     error = "Please select a process."
                 else:
                     uploaded_file_instance = UploadedFile(
-                        file=uploaded_file,
                         user=request.user,
                         process=selected_process
                     )
-                    uploaded_file_instance.save()
+                    store_upload(uploaded_file_instance, uploaded_file)
                     message = "File uploaded successfully!"
                     file_path = uploaded_file_instance.file.path
-                    success, clean_msg, cleaned_file_path  = clean(file_path, selected_process)
-                    if not success:
-                        error = f"Upload succeeded but cleaning failed: {clean_msg}"
-                        logging.error(error)
-                    else:
-                        message = "File uploaded and cleaned successfully!"
-                        logging.info("Clean successful - about to copy cleaned file")
-
-                        try:
-                            # Extract Raw Date from cleaned file (to track which date’s data was uploaded)
-                            df = pd.read_csv(cleaned_file_path)
-                            if 'Raw Date' in df.columns:
-                                raw_dates = df['Raw Date'].dropna().unique()
-                                for date_str in raw_dates:
-                                    try:
-                                        parsed_date = pd.to_datetime(date_str, format='%d-%m-%Y').date()
-                                        # Update or create status entry
-                                        UploadStatus.objects.update_or_create(
-                                            process=selected_process,
-                                            date=parsed_date,
-                                            defaults={
-                                                'status': 'Uploaded',
-                                                'uploaded_file': uploaded_file_instance
-                                            }
-                                        )
-                                    except Exception as e:
-                                        logging.error(f"Invalid Raw Date '{date_str}' for process {selected_process}: {e}")
-                        except Exception as e:
-                            logging.error(f"Could not read cleaned file for status tracking: {e}")
-
-
-                        logging.info(f"cleaned_file_path: {cleaned_file_path}")
-                        
-
-                        try:
-                            safe_process = selected_process.replace(" ", "_")
-                            destination_dir = os.path.join('/Disposition_Portal_Data', safe_process, 'APR_Clean')
-                            os.makedirs(destination_dir, exist_ok=True)
-
-                            logging.info(f"Checking if file exists: {cleaned_file_path}")
-                            logging.info(f"os.path.exists: {os.path.exists(cleaned_file_path)}")
-
-                            if not os.path.exists(cleaned_file_path ):
-                                logging.error(f"File does not exist: {cleaned_file_path }")
-                            else:
-                                map_path = os.path.join(settings.MEDIA_ROOT, 'Map', 'map.csv')
-                                if os.path.exists(map_path):
-                                    mapping_df = pd.read_csv(map_path, header=None)
-                                    process_row = mapping_df[mapping_df[0].str.strip().str.lower() == selected_process.strip().lower()]
-
-                                    if not process_row.empty:
-                                        pn = str(process_row.iloc[0, 4]).strip()   # 5th column
-                                        original_filename = os.path.basename(cleaned_file_path)
-                                        new_filename = f"{pn}%{original_filename}"
-                                        destination_path = os.path.join(destination_dir, new_filename)
-
-                                        shutil.copy2(cleaned_file_path, destination_path)
-                                        logging.info(f"Copied '{cleaned_file_path}' to '{destination_path}'")
-                                    else:
-                                        logging.error(f"No mapping row found for process: {selected_process}")
-                                else:
-                                    logging.error(f"Mapping file not found: {map_path}")
-
-                        except Exception as e:
-                            error = f"File cleaned but failed to copy to destination: {str(e)}"
-                            logging.error(error)
+                    with log_context(process=selected_process, upload_id=uploaded_file_instance.id):
+                        cleaned, error, summary = finish_upload(uploaded_file_instance, selected_process, file_path)
+                    if cleaned:
+                        message = f"File uploaded and cleaned successfully! {summary}."
             
             else:
                 error = f"Upload failed: {msg}"
@@ -144,3 +88,140 @@ def upload_file(request):
         'error': error,
         'process_options': process_options  # Pass options to template
     })
+
+
+def store_upload(uploaded_file_instance, uploaded_file):
+    """
+    Write the file to disk and save its UploadedFile row, holding the DB write
+    lock only for the statements. The date layout puts the upload id in the
+    path, so there the row is inserted first and the file name set after.
+    """
+    if settings.STORAGE_LAYOUT != 'date':
+        uploaded_file_instance.file.save(uploaded_file.name, uploaded_file, save=False)
+        serialized_write(uploaded_file_instance.save)
+        return
+    serialized_write(uploaded_file_instance.save)
+    try:
+        uploaded_file_instance.file.save(uploaded_file.name, uploaded_file, save=False)
+    except Exception:
+        serialized_write(uploaded_file_instance.delete)
+        raise
+    serialized_write(uploaded_file_instance.save, update_fields=['file'])
+
+
+def get_user_upload(request, pk):
+    """The UploadedFile with this id if the user owns it (staff see all), else 404."""
+    uploaded = get_object_or_404(UploadedFile, pk=pk)
+    if not request.user.is_staff and uploaded.user_id != request.user.id:
+        raise Http404("File not found")
+    if not uploaded.file:
+        # Row inserted by store_upload, file not written yet (or never, if the worker died)
+        raise Http404("File not found")
+    return uploaded
+
+
+@login_required
+@require_safe
+def download_file(request, pk, kind='raw'):
+    """Download an upload (kind='raw') or its cleaned CSV (kind='clean'); owners and staff only."""
+    uploaded = get_user_upload(request, pk)
+    path = uploaded.file.path if kind == 'raw' else cleaned_path_for(uploaded)
+    if os.path.isfile(path):
+        return serve_file(request, path)
+    # Moved off the live tree by apply_retention
+    archived = uploaded.archived_files.filter(kind=kind, purged_at=None).first()
+    if archived is None:
+        raise Http404("File not found")
+    return serve_archived(request, archived)
+
+
+def cleaned_page(request, pk):
+    uploaded = get_user_upload(request, pk)
+    path = cleaned_path_for(uploaded)
+    if not os.path.isfile(path):
+        # Archived files can still be downloaded, but are not paged
+        raise Http404("Cleaned file not found or archived")
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page, page_size = 1, DEFAULT_PAGE_SIZE
+    return uploaded, read_page(path, page, page_size)
+
+
+@login_required
+@require_safe
+def preview_file(request, pk):
+    """One page of an upload's cleaned CSV as an HTML table."""
+    uploaded, data = cleaned_page(request, pk)
+    return render(request, 'preview.html', {'uploaded': uploaded, **data})
+
+
+@login_required
+@require_safe
+def preview_api(request, pk):
+    """One page of an upload's cleaned CSV as JSON: header, rows and paging totals."""
+    uploaded, data = cleaned_page(request, pk)
+    return JsonResponse({'id': uploaded.id, 'process': uploaded.process, **data})
+
+
+@login_required
+@require_safe
+def download_format(request, process):
+    """Reference format.xlsx for a process listed in process.csv."""
+    if process not in get_process_options():
+        raise Http404("Unknown process")
+    path = reference_format_path(process)
+    if not os.path.isfile(path):
+        raise Http404("Format not found")
+    return serve_file(request, path, filename=f"{process} format.xlsx")
+
+
+def finish_upload(uploaded_file_instance, selected_process, file_path):
+    """
+    Clean a saved upload, record its dates in UploadStatus and copy the output to the portal.
+    Returns (cleaned, error, summary): error is an empty string on success and
+    summary is clean()'s row count message.
+    """
+    from .utils import clean, clean_fingerprint
+
+    success, clean_msg, cleaned_file_path  = clean(file_path, selected_process, upload_id=uploaded_file_instance.id)
+    if not success:
+        error = f"Upload succeeded but cleaning failed: {clean_msg}"
+        logger.error(error)
+        return False, error, ""
+
+    logger.info(f"Clean successful ({clean_msg}) - about to copy cleaned file")
+    uploaded_file_instance.cleaned_file = os.path.relpath(cleaned_file_path, settings.MEDIA_ROOT)
+    uploaded_file_instance.clean_fingerprint = clean_fingerprint(file_path)
+    serialized_write(uploaded_file_instance.save, update_fields=['cleaned_file', 'clean_fingerprint'])
+
+    try:
+        # Extract Raw Date from cleaned file (to track which date’s data was uploaded)
+        dates, invalid_dates = cleaned_dates(cleaned_file_path)
+        record_upload_dates(uploaded_file_instance, selected_process, dates)
+        if invalid_dates:
+            # One record per upload, not per row
+            logger.error(
+                f"{len(invalid_dates)} invalid Raw Date value(s) for process {selected_process}, "
+                f"e.g. {invalid_dates[:5]}"
+            )
+    except Exception as e:
+        logger.error(f"Could not read cleaned file for status tracking: {e}")
+
+    logger.debug(f"cleaned_file_path: {cleaned_file_path}")
+
+    try:
+        destination_path = publish_to_portal(selected_process, cleaned_file_path, upload_id=uploaded_file_instance.id)
+        if destination_path:
+            logger.info(f"Copied '{cleaned_file_path}' to '{destination_path}'")
+        else:
+            logger.info(f"No new or changed rows in '{cleaned_file_path}'; nothing published")
+    except (FileNotFoundError, LookupError) as e:
+        logger.error(f"Could not publish cleaned file: {e}")
+    except Exception as e:
+        error = f"File cleaned but failed to copy to destination: {str(e)}"
+        logger.error(error)
+        return True, error, clean_msg
+
+    return True, "", clean_msg